@@ -2,6 +2,8 @@ import functools
 
 import flask
 
+from page_cache import static_page
+
 app = flask.Flask(__name__)
 
 @app.get('/')
@@ -9,6 +11,7 @@ def index():
     return flask.redirect('/selector_playground')
 
 @app.get("/dynamic_disclose")
+@static_page
 def dynamic_disclosure():
     return '''
     <div id=container>
@@ -29,7 +32,39 @@ def dynamic_disclosure():
     </script>
     '''
 
+@app.get('/mutation_timing')
+def mutation_timing():
+    """
+    After start() appends `mutations` divs (#mutation-0, #mutation-1, …), each `delay` + up to `jitter` ms after the previous one.
+    window.mutationTimes has the time of each append as performance.timeOrigin + performance.now(),
+    to compare against the moment a framework noticed it.
+    """
+    delay = max(0, flask.request.args.get('delay', 1000, type=int))
+    jitter = max(0, flask.request.args.get('jitter', 300, type=int))
+    mutations = max(1, min(flask.request.args.get('mutations', 3, type=int), 1000))
+    return f'''
+    <button onclick=start()>Start</button>
+    <script>
+    window.mutationTimes = []
+    function start() {{
+        let at = 0
+        for (let index = 0; index < {mutations}; index++) {{
+            at += {delay} + Math.random() * {jitter}
+            setTimeout(() => {{
+                const element = document.createElement('div')
+                element.id = 'mutation-' + index
+                element.className = 'mutation'
+                element.textContent = 'mutation ' + index
+                document.body.appendChild(element)
+                mutationTimes[index] = performance.timeOrigin + performance.now()
+            }}, at)
+        }}
+    }}
+    </script>
+    '''
+
 @app.get('/form')
+@static_page
 def form():
     return '''
     <form>
@@ -40,6 +75,7 @@ def form():
     '''
 
 @app.get('/selector_playground')
+@static_page
 def selector_playground():
     return '''
     <form>
@@ -74,6 +110,7 @@ def basic_auth():
     return 'Authenticated'
 
 @app.get('/hidden')
+@static_page
 def hidden():
     return '''
     <!doctype html>
@@ -94,6 +131,7 @@ def hidden():
     '''
 
 @app.get('/shadow')
+@static_page
 def shadow():
     return '''
     <!doctype html>
@@ -125,4 +163,84 @@ def shadow():
         <labeled-input name=last type=text label-text="Last Name" mode=closed></labeled-input>
     </body>
     </html>
-    '''
\ No newline at end of file
+    '''
+
+## Stress pages
+
+# Big doms to see how finding, filling and waiting scale. The size comes from the query string, clamped,
+# and the page is streamed in batches of rows, so the server never holds more than one batch in memory.
+
+def scale(name, default, maximum):
+    "int query argument, clamped so a typo doesn't take down the browser"
+    return max(1, min(flask.request.args.get(name, default, type=int), maximum))
+
+def batched(lines, size=1000):
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= size:
+            yield ''.join(batch)
+            batch = []
+    yield ''.join(batch)
+
+def streamed(generator):
+    @functools.wraps(generator)
+    def route(*args, **kwargs):
+        return flask.Response(flask.stream_with_context(batched(generator(*args, **kwargs))), mimetype='text/html')
+    return route
+
+@app.get('/stress/table')
+@streamed
+def stress_table():
+    rows, columns = scale('rows', 10_000, 1_000_000), scale('columns', 5, 50)
+    yield f'<!doctype html><html><body><table id=stress data-rows={rows}>'
+    for row in range(rows):
+        cells = ''.join(f'<td>cell {row}-{column}</td>' for column in range(columns))
+        yield f'<tr id=row-{row}>{cells}</tr>'
+    yield '</table></body></html>'
+
+@app.get('/stress/nested')
+@streamed
+def stress_nested():
+    # html parsers cap the nesting depth (chrome at 512), deeper elements end up as siblings
+    depth = scale('depth', 500, 10_000)
+    yield '<!doctype html><html><body>'
+    for level in range(depth):
+        yield f'<div class=level-{level}>'
+    yield '<span id=deepest>deepest</span>'
+    for level in range(depth):
+        yield '</div>'
+    yield '</body></html>'
+
+@app.get('/stress/form')
+@streamed
+def stress_form():
+    fields = scale('fields', 1_000, 100_000)
+    yield '<!doctype html><html><body><form>'
+    for field in range(fields):
+        yield (
+            f'<div><label for=field-{field}>Field {field}</label>'
+            f'<input id=field-{field} name=field-{field} placeholder="placeholder {field}"></div>'
+        )
+    yield '</form></body></html>'
+
+@app.get('/stress/shadow')
+@streamed
+def stress_shadow():
+    "components × depth shadow roots, nested in each other, the innermost one holds a labeled input"
+    components, depth = scale('components', 100, 10_000), scale('depth', 3, 50)
+    yield '''<!doctype html><html><head><script>
+    customElements.define('nested-input', class extends HTMLElement {
+        connectedCallback() {
+            const depth = Number(this.getAttribute('depth'))
+            const index = this.getAttribute('index')
+            const shadow = this.attachShadow({ mode: 'open' })
+            shadow.innerHTML = depth > 1
+                ? `<div><nested-input depth=${ depth - 1 } index=${ index }></nested-input></div>`
+                : `<label>Field ${ index } <input name=field-${ index }></label>`
+        }
+    })
+    </script></head><body>'''
+    for component in range(components):
+        yield f'<nested-input depth={depth} index={component}></nested-input>'
+    yield '</body></html>'
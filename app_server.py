@@ -0,0 +1,39 @@
+# Serve the flask app from a background thread inside the test process
+#
+# No reloader, no file watcher, no extra process. The listening socket is bound before the thread starts,
+# so the server is ready as soon as `serving()` returns. Port 0 lets the OS pick a free port, so several
+# test sessions can run side by side.
+#
+# With keep_alive (the default) connections are reused across requests via HTTP/1.1, and the listen backlog
+# is big enough for many browsers opening their connections at once, so running wide doesn't queue on the server.
+
+import threading
+from contextlib import contextmanager
+
+from werkzeug.serving import ThreadedWSGIServer, WSGIRequestHandler, make_server
+
+class KeepAliveHandler(WSGIRequestHandler):
+    # werkzeug < 2.1 answers with HTTP/1.0, which closes the connection after every response
+    protocol_version = 'HTTP/1.1'
+    # every open connection holds a thread, idle ones are let go eventually
+    timeout = 30
+    # headers and body are separate writes, with Nagle the body waits for the delayed ack of the headers (~40ms)
+    disable_nagle_algorithm = True
+
+class ConcurrentServer(ThreadedWSGIServer):
+    request_queue_size = 1024
+
+@contextmanager
+def serving(app, host='127.0.0.1', port=0, keep_alive=True):
+    if keep_alive:
+        server = ConcurrentServer(host, port, app, handler=KeepAliveHandler)
+    else:
+        server = make_server(host, port, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, kwargs=dict(poll_interval=.1), name='flask', daemon=True)
+    thread.start()
+    try:
+        yield f'http://{host}:{server.server_port}'
+    finally:
+        server.shutdown()
+        thread.join()
+        server.server_close()
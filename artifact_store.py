@@ -0,0 +1,141 @@
+# Test artifacts, stored once per content
+#
+# Screenshots of the same page are mostly the same bytes, run after run. The store keeps one file per sha256
+# and hard links it to wherever a test wants its artifact, so a thousand identical screenshots take the space of one.
+#
+#   store = ArtifactStore(root)
+#   path = store.save(driver.get_screenshot_as_png(), tmp_path / 'screenshot.png')
+#   store.adopt(trace_path)  # a file some framework wrote, replaced by a link into the store
+#
+# Hard links only work within one file system, elsewhere the object is copied (and the store still deduplicates).
+# Objects are read only, so writing to a linked artifact can't change every other copy.
+# Objects nobody links to anymore (pytest removes old tmp_paths) are removed by prune().
+
+import functools
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+CHUNK_SIZE = 1024 * 1024
+
+def default_root():
+    # the system temp dir is where pytest puts tmp_path, so links stay on the same file system
+    return Path(tempfile.gettempdir()) / 'browser-automation-artifacts'
+
+def digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+def file_digest(path):
+    stat = Path(path).stat()
+    return cached_file_digest(Path(path).resolve(), stat.st_size, stat.st_mtime_ns)
+
+@functools.lru_cache(maxsize=1024)
+def cached_file_digest(path, size, mtime_ns):
+    # size and mtime are part of the key, a rewritten file is hashed again
+    hash = hashlib.sha256()
+    with open(path, 'rb') as file:
+        while chunk := file.read(CHUNK_SIZE):
+            hash.update(chunk)
+    return hash.hexdigest()
+
+def same_content(data_or_path, other_path):
+    "cheap equality check before decoding anything"
+    if isinstance(data_or_path, (bytes, bytearray)):
+        return digest(data_or_path) == file_digest(other_path)
+    return file_digest(data_or_path) == file_digest(other_path)
+
+class ArtifactStore:
+
+    def __init__(self, root=None):
+        self.root = Path(root or default_root())
+        (self.root / 'objects').mkdir(parents=True, exist_ok=True)
+    
+    def object_path(self, digest):
+        return self.root / 'objects' / digest[:2] / digest[2:]
+    
+    def put(self, data):
+        "store bytes, returns their digest"
+        key = digest(data)
+        path = self.object_path(key)
+        if not path.exists():
+            self.write_object(path, lambda file: file.write(data))
+        return key
+    
+    def write_object(self, path, write):
+        path.parent.mkdir(exist_ok=True)
+        # write and rename, parallel workers storing the same content both succeed with identical files
+        temporary_path = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+        with open(temporary_path, 'wb') as file:
+            write(file)
+        os.chmod(temporary_path, 0o444)
+        os.replace(temporary_path, path)
+    
+    def link(self, key, path):
+        "the object as path, hard linked if possible. Whatever was at path stays until the link is in place"
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+        try:
+            os.link(self.object_path(key), temporary_path)
+        except FileNotFoundError:
+            # the object is gone (pruned), nothing to copy either
+            raise
+        except OSError:
+            # other file system, or no hard links there
+            shutil.copyfile(self.object_path(key), temporary_path)
+        os.replace(temporary_path, path)
+        return path
+    
+    def save(self, data, path):
+        "bytes as a file at path, stored once"
+        key = self.put(data)
+        try:
+            return self.link(key, path)
+        except FileNotFoundError:
+            # pruned by another process between put() and link()
+            return self.link(self.put(data), path)
+    
+    def adopt(self, path):
+        "replace a file by a link into the store, returns its digest"
+        path = Path(path)
+        key = file_digest(path)
+        while True:
+            self.store_file(key, path)
+            try:
+                self.link(key, path)
+                return key
+            except FileNotFoundError:
+                # pruned by another process in between, path is still untouched
+                continue
+    
+    def store_file(self, key, path):
+        object_path = self.object_path(key)
+        if object_path.exists():
+            return
+        object_path.parent.mkdir(exist_ok=True)
+        temporary_path = object_path.with_name(f'{object_path.name}.{os.getpid()}.tmp')
+        try:
+            # the file itself becomes the object, nothing is copied
+            os.link(path, temporary_path)
+            os.chmod(temporary_path, 0o444)
+            os.replace(temporary_path, object_path)
+        except OSError:
+            with open(path, 'rb') as source:
+                self.write_object(object_path, lambda file: shutil.copyfileobj(source, file))
+    
+    def prune(self, min_age=24 * 60 * 60):
+        "remove objects that are only referenced by the store itself, returns the number of bytes freed"
+        freed = 0
+        cutoff = time.time() - min_age
+        for path in (self.root / 'objects').glob('*/*'):
+            try:
+                stat = path.stat()
+                if 1 == stat.st_nlink and stat.st_mtime < cutoff:
+                    path.unlink()
+                    freed += stat.st_size
+            except FileNotFoundError:
+                pass
+        return freed
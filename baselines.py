@@ -0,0 +1,290 @@
+# Keep timings around across runs and find out which change made things slower
+#
+#   pytest --record-baseline                  # or together with --benchmark, for more samples per use case
+#   python baselines.py runs
+#   python baselines.py compare 1d5cca2       # latest run against all runs of that commit
+#   python baselines.py compare 1d5cca2 HEAD  # or two commits against each other
+#   python baselines.py compare run:12 run:14 # single runs, ids as listed by `runs`
+#
+# Every passed test contributes its call duration and everything recorded via benchmark.record_timing()
+# (reset budgets, concurrent contexts, …), keyed by git commit, framework, browser, use case and operation.
+# The versions of the automation libraries are stored with every run, so upgrades in requirements.txt are easy to spot.
+#
+# A regression is a one sided Mann-Whitney U test that says the new samples tend to be larger,
+# plus a median at least --threshold times the old one, so tiny but significant differences don't cry wolf.
+
+import argparse
+import json
+import math
+import sqlite3
+import statistics
+import subprocess
+import sys
+from datetime import datetime, timezone
+from importlib import metadata
+
+import disk_cache
+from benchmark import BENCHMARK_PROPERTY, TIMING_PROPERTY, browser_of, framework_of, properties, use_case_of
+
+BASELINE_PROPERTY = 'baseline'
+LIBRARIES = ('playwright', 'selenium', 'capybara-py', 'selene', 'splinter', 'pytest')
+
+SCHEMA = '''
+create table if not exists runs (
+    id integer primary key,
+    git_commit text not null,
+    dirty integer not null,
+    started text not null,
+    versions text not null
+);
+create table if not exists samples (
+    run_id integer not null references runs(id),
+    framework text not null,
+    browser text not null,
+    use_case text not null,
+    operation text not null,
+    seconds real not null
+);
+create index if not exists samples_by_run on samples(run_id);
+'''
+
+def default_database():
+    return disk_cache.cache_dir() / 'baselines.sqlite'
+
+def connect(path):
+    connection = sqlite3.connect(path)
+    connection.executescript(SCHEMA)
+    return connection
+
+def git(*args):
+    return subprocess.run(['git', *args], capture_output=True, text=True, check=True).stdout.strip()
+
+def current_commit():
+    "commit hash and whether the working tree has uncommitted changes"
+    try:
+        return git('rev-parse', 'HEAD'), bool(git('status', '--porcelain', '--untracked-files=no'))
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown', True
+
+def library_versions():
+    versions = {}
+    for library in LIBRARIES:
+        try:
+            versions[library] = metadata.version(library)
+        except metadata.PackageNotFoundError:
+            pass
+    return versions
+
+## Plugin
+
+def pytest_addoption(parser):
+    parser.addoption('--record-baseline', default=False, action='store_true',
+        help='store the timings of this run, see `python baselines.py --help`. default: false')
+    parser.addoption('--baseline-database', default=None, metavar='PATH',
+        help='sqlite database for --record-baseline. default: baselines.sqlite in the cache directory')
+
+def pytest_configure(config):
+    if config.getoption('record_baseline'):
+        config.pluginmanager.register(Recorder(config), 'baseline-recorder')
+
+class Recorder:
+
+    def __init__(self, config):
+        self.config = config
+        self.samples = []
+        self.failed_nodeids = set()
+        self.stored = None
+        self.warmup = config.getoption('benchmark_warmup') if config.getoption('benchmark') else 0
+    
+    def pytest_runtest_setup(self, item):
+        # runs on the xdist workers, the property travels with the reports to the controller
+        item.user_properties.append((BASELINE_PROPERTY, dict(
+            framework=framework_of(item),
+            browser=browser_of(item) or '',
+            use_case=use_case_of(item),
+        )))
+    
+    def pytest_runtest_logreport(self, report):
+        keys = properties(report, BASELINE_PROPERTY)
+        if not keys:
+            return
+        if report.failed:
+            self.failed_nodeids.add(report.nodeid)
+            return
+        benchmarks = properties(report, BENCHMARK_PROPERTY)
+        if benchmarks and benchmarks[0]['round'] < self.warmup:
+            return
+        
+        key = keys[0]
+        if 'call' == report.when and report.passed:
+            self.samples.append(dict(key, nodeid=report.nodeid, operation='call', seconds=report.duration))
+        if 'teardown' == report.when:
+            for timing in properties(report, TIMING_PROPERTY):
+                self.samples.append(dict(key, nodeid=report.nodeid, **timing))
+    
+    def pytest_sessionfinish(self, session):
+        if hasattr(session.config, 'workeroutput'):
+            return
+        samples = [sample for sample in self.samples if sample['nodeid'] not in self.failed_nodeids]
+        if not samples:
+            return
+        
+        commit, dirty = current_commit()
+        path = self.config.getoption('baseline_database') or default_database()
+        with connect(path) as connection:
+            run_id = connection.execute(
+                'insert into runs (git_commit, dirty, started, versions) values (?, ?, ?, ?)',
+                (commit, dirty, datetime.now(timezone.utc).isoformat(), json.dumps(library_versions())),
+            ).lastrowid
+            connection.executemany(
+                'insert into samples (run_id, framework, browser, use_case, operation, seconds) values (?, ?, ?, ?, ?, ?)',
+                [(run_id, sample['framework'], sample['browser'], sample['use_case'], sample['operation'], sample['seconds'])
+                    for sample in samples],
+            )
+        self.stored = (run_id, commit, len(samples), path)
+    
+    def pytest_terminal_summary(self, terminalreporter):
+        if self.stored is None:
+            return
+        run_id, commit, count, path = self.stored
+        terminalreporter.write_line(f'stored {count} timings as run {run_id} of {commit[:10]} in {path}')
+
+## Statistics
+
+def mann_whitney_u(baseline, candidate):
+    """
+    One sided p value for 'candidate samples tend to be larger than baseline samples'.
+    Normal approximation with tie and continuity correction, which is fine from about 5 samples per side.
+    """
+    n1, n2 = len(candidate), len(baseline)
+    combined = sorted([(value, True) for value in candidate] + [(value, False) for value in baseline])
+    
+    # average ranks for ties
+    candidate_rank_sum, ties, index = 0, 0, 0
+    while index < len(combined):
+        end = index
+        while end + 1 < len(combined) and combined[end + 1][0] == combined[index][0]:
+            end += 1
+        rank = (index + end) / 2 + 1
+        count = end - index + 1
+        candidate_rank_sum += rank * sum(1 for _, is_candidate in combined[index:end + 1] if is_candidate)
+        ties += count ** 3 - count
+        index = end + 1
+    
+    u = candidate_rank_sum - n1 * (n1 + 1) / 2
+    n = n1 + n2
+    variance = n1 * n2 / 12 * ((n + 1) - ties / (n * (n - 1)))
+    if 0 == variance:
+        # all samples identical
+        return 1.0
+    z = (u - n1 * n2 / 2 - .5) / math.sqrt(variance)
+    return .5 * math.erfc(z / math.sqrt(2))
+
+## Command line
+
+RUN_PREFIX = 'run:'
+
+def resolve_runs(connection, reference):
+    """
+    run ids for `run:<id>`, a (prefix of a) commit, or anything git can resolve to a commit like HEAD~1.
+    Run ids need the prefix, an abbreviated commit can be all digits too.
+    """
+    if reference.startswith(RUN_PREFIX):
+        run_id = reference.removeprefix(RUN_PREFIX)
+        rows = connection.execute('select id from runs where id = ?', (run_id,)).fetchall() if run_id.isdigit() else []
+        if not rows:
+            raise SystemExit(f'no run {run_id}, see `baselines.py runs`')
+        return [id for id, in rows]
+    try:
+        reference = git('rev-parse', reference)
+    except (OSError, subprocess.CalledProcessError):
+        pass
+    rows = connection.execute('select id from runs where git_commit like ?', (reference + '%',)).fetchall()
+    if not rows:
+        raise SystemExit(f'no runs for {reference}')
+    return [id for id, in rows]
+
+def samples_of(connection, run_ids):
+    samples = {}
+    placeholders = ', '.join('?' * len(run_ids))
+    for framework, browser, use_case, operation, seconds in connection.execute(
+        f'select framework, browser, use_case, operation, seconds from samples where run_id in ({placeholders})', run_ids
+    ):
+        samples.setdefault((framework, browser, use_case, operation), []).append(seconds)
+    return samples
+
+def versions_of(connection, run_ids):
+    return [json.loads(versions) for versions, in connection.execute(
+        f'select versions from runs where id in ({", ".join("?" * len(run_ids))}) order by id', run_ids)]
+
+def compare(connection, baseline_runs, candidate_runs, alpha, threshold, min_samples):
+    "rows for every key measured in both, the regressions first"
+    baseline, candidate = samples_of(connection, baseline_runs), samples_of(connection, candidate_runs)
+    rows = []
+    for key in sorted(baseline.keys() & candidate.keys()):
+        old, new = baseline[key], candidate[key]
+        ratio = statistics.median(new) / statistics.median(old) if statistics.median(old) else math.inf
+        if min(len(old), len(new)) < min_samples:
+            p_value, verdict = None, 'too few samples'
+        else:
+            p_value = mann_whitney_u(old, new)
+            verdict = 'REGRESSION' if p_value < alpha and ratio >= threshold else 'ok'
+        rows.append(dict(key=key, old=old, new=new, ratio=ratio, p_value=p_value, verdict=verdict))
+    return sorted(rows, key=lambda row: ('REGRESSION' != row['verdict'], -row['ratio']))
+
+def print_runs(connection):
+    for id, commit, dirty, started, versions, count in connection.execute('''
+        select runs.id, git_commit, dirty, started, versions, count(samples.run_id)
+        from runs left join samples on samples.run_id = runs.id group by runs.id order by runs.id
+    '''):
+        versions = ' '.join(f'{library}={version}' for library, version in json.loads(versions).items())
+        print(f'{id:4d}  {commit[:10]}{"+dirty" if dirty else "      "}  {started[:19]}  {count:6d} samples  {versions}')
+
+def print_comparison(rows, baseline_versions, candidate_versions):
+    changed = {
+        library: (baseline_versions[-1].get(library), version)
+        for library, version in candidate_versions[-1].items()
+        if baseline_versions[-1].get(library) != version
+    }
+    for library, (old, new) in changed.items():
+        print(f'{library}: {old} -> {new}')
+    
+    for row in rows:
+        framework, browser, use_case, operation = row['key']
+        p_value = '-' if row['p_value'] is None else f"{row['p_value']:.4f}"
+        print(
+            f"{row['verdict']:15}  {framework}/{browser}/{use_case}/{operation}  "
+            f"median {statistics.median(row['old']):.4f}s -> {statistics.median(row['new']):.4f}s "
+            f"({row['ratio']:.2f}x, p={p_value}, n={len(row['old'])}/{len(row['new'])})"
+        )
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description='timings stored by `pytest --record-baseline`')
+    parser.add_argument('--database', default=None, help='default: baselines.sqlite in the cache directory')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('runs', help='list stored runs')
+    comparison = commands.add_parser('compare', help='flag operations that got significantly slower')
+    comparison.add_argument('baseline', help='run:<id>, commit or anything git rev-parse understands')
+    comparison.add_argument('candidate', nargs='?', default=None, help='default: the latest run')
+    comparison.add_argument('--alpha', type=float, default=.01, help='significance level. default: 0.01')
+    comparison.add_argument('--threshold', type=float, default=1.1,
+        help='minimum ratio of the medians to count as a regression. default: 1.1')
+    comparison.add_argument('--min-samples', type=int, default=5, help='per side. default: 5')
+    arguments = parser.parse_args(arguments)
+    
+    connection = connect(arguments.database or default_database())
+    if 'runs' == arguments.command:
+        print_runs(connection)
+        return 0
+    
+    baseline_runs = resolve_runs(connection, arguments.baseline)
+    if arguments.candidate is None:
+        candidate_runs = [connection.execute('select max(id) from runs').fetchone()[0]]
+    else:
+        candidate_runs = resolve_runs(connection, arguments.candidate)
+    rows = compare(connection, baseline_runs, candidate_runs, arguments.alpha, arguments.threshold, arguments.min_samples)
+    print_comparison(rows, versions_of(connection, baseline_runs), versions_of(connection, candidate_runs))
+    return 1 if any('REGRESSION' == row['verdict'] for row in rows) else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
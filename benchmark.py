@@ -0,0 +1,180 @@
+# Benchmark mode for the whole comparison
+#
+#   pytest --benchmark --benchmark-rounds 10 --benchmark-warmup 2 --benchmark-json benchmark.json
+#
+# Every use case is executed rounds + warmup times (each round is its own test item, so function scoped
+# fixtures are set up fresh every time). Warmup rounds are discarded, the rest is reported as
+# min / median / p95 per framework × browser × use case.
+
+import json
+import math
+import statistics
+import time
+from contextlib import contextmanager
+
+import pytest
+
+BENCHMARK_PROPERTY = 'benchmark'
+TIMING_PROPERTY = 'timing'
+
+def pytest_addoption(parser):
+    parser.addoption('--benchmark', default=False, action='store_true',
+        help='run every use case repeatedly and report timing statistics. default: false')
+    parser.addoption('--benchmark-rounds', default=5, type=int, help='measured rounds per use case. default: 5')
+    parser.addoption('--benchmark-warmup', default=1, type=int, help='discarded warmup rounds per use case. default: 1')
+    parser.addoption('--benchmark-json', default=None, metavar='PATH', help='write benchmark statistics as json to PATH')
+
+def is_benchmarking(config):
+    return config.getoption('benchmark')
+
+# parametrization needs a fixture to attach to, the parameter is the round number
+@pytest.fixture(autouse=True)
+def benchmark_round(request):
+    return getattr(request, 'param', None)
+
+def pytest_generate_tests(metafunc):
+    config = metafunc.config
+    if not is_benchmarking(config) or 'benchmark_round' not in metafunc.fixturenames:
+        return
+    
+    rounds = config.getoption('benchmark_warmup') + config.getoption('benchmark_rounds')
+    metafunc.parametrize('benchmark_round', range(rounds), ids=lambda each: f'round{each}')
+
+## Recording
+
+def framework_of(item):
+    return item.module.__name__.removeprefix('with_')
+
+def browser_of(item):
+    callspec = getattr(item, 'callspec', None)
+    if callspec is None:
+        return None
+    return callspec.params.get('browser_vendor')
+
+def use_case_of(item):
+    return item.originalname.removeprefix('test_')
+
+def record_timing(node, operation, seconds):
+    """
+    Attach a timing sample of a named operation to the test report.
+    
+    user_properties survive the trip from xdist workers to the controller and end up in junit xml as well.
+    """
+    node.user_properties.append((TIMING_PROPERTY, dict(operation=operation, seconds=seconds)))
+
+@contextmanager
+def timing(node, operation):
+    "`with timing(request.node, 'find by id'): …` records how long the block took"
+    start = time.perf_counter()
+    yield
+    record_timing(node, operation, time.perf_counter() - start)
+
+def pytest_runtest_setup(item):
+    if not is_benchmarking(item.config):
+        return
+    
+    item.user_properties.append((BENCHMARK_PROPERTY, dict(
+        framework=framework_of(item),
+        browser=browser_of(item),
+        use_case=use_case_of(item),
+        round=item.callspec.params.get('benchmark_round'),
+    )))
+
+def properties(report, name):
+    return [value for key, value in report.user_properties if key == name]
+
+class Collector:
+
+    def __init__(self, warmup):
+        self.warmup = warmup
+        self.samples = {}
+        self.failed = {}
+        self.failed_nodeids = set()
+    
+    def pytest_runtest_logreport(self, report):
+        benchmarks = properties(report, BENCHMARK_PROPERTY)
+        if not benchmarks:
+            return
+        
+        benchmark = benchmarks[0]
+        key = (benchmark['framework'], benchmark['browser'], benchmark['use_case'])
+        if report.failed:
+            self.failed[key] = self.failed.get(key, 0) + 1
+            self.failed_nodeids.add(report.nodeid)
+            return
+        if benchmark['round'] < self.warmup or report.nodeid in self.failed_nodeids:
+            return
+        
+        # call duration comes from the call report, everything recorded via record_timing() from the teardown report
+        # as that is the only one that has seen all of setup, call and teardown
+        if 'call' == report.when and report.passed:
+            self.samples.setdefault(key + ('call',), []).append(report.duration)
+        if 'teardown' == report.when:
+            for timing in properties(report, TIMING_PROPERTY):
+                self.samples.setdefault(key + (timing['operation'],), []).append(timing['seconds'])
+    
+    def rows(self):
+        rows = []
+        for (framework, browser, use_case, operation), samples in sorted(self.samples.items(), key=sort_key):
+            rows.append(dict(
+                framework=framework, browser=browser, use_case=use_case, operation=operation,
+                failed=self.failed.get((framework, browser, use_case), 0),
+                **summarize(samples),
+            ))
+        return rows
+
+def sort_key(item):
+    return tuple(each or '' for each in item[0])
+
+## Statistics
+
+def percentile(samples, percent):
+    "nearest rank percentile, good enough for the handful of samples a benchmark run produces"
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(percent / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+def summarize(samples):
+    return dict(
+        rounds=len(samples),
+        min=min(samples),
+        median=statistics.median(samples),
+        p95=percentile(samples, 95),
+        mean=statistics.fmean(samples),
+        stdev=statistics.stdev(samples) if len(samples) > 1 else 0.0,
+    )
+
+## Reporting
+
+def pytest_configure(config):
+    if is_benchmarking(config):
+        config.pluginmanager.register(Collector(config.getoption('benchmark_warmup')), 'benchmark-collector')
+
+def pytest_terminal_summary(terminalreporter, config):
+    collector = config.pluginmanager.get_plugin('benchmark-collector')
+    if collector is None:
+        return
+    
+    rows = collector.rows()
+    write_table(terminalreporter, rows)
+    
+    path = config.getoption('benchmark_json')
+    if path is not None:
+        with open(path, 'w') as file:
+            json.dump(rows, file, indent=2)
+        terminalreporter.write_line(f'benchmark results written to {path}')
+
+def write_table(terminalreporter, rows):
+    terminalreporter.write_sep('=', 'benchmark (seconds)')
+    columns = ('framework', 'browser', 'use_case', 'operation', 'rounds', 'failed', 'min', 'median', 'p95')
+    
+    def cell(row, column):
+        value = row[column]
+        if isinstance(value, float):
+            return f'{value:.4f}'
+        return str(value)
+    
+    table = [columns] + [tuple(cell(row, column) for column in columns) for row in rows]
+    widths = [max(len(line[index]) for line in table) for index in range(len(columns))]
+    for line in table:
+        terminalreporter.write_line('  '.join(each.ljust(width) for each, width in zip(line, widths)))
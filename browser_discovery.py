@@ -0,0 +1,141 @@
+# Find browser executables once and remember them
+#
+# Lookup order for each browser:
+# 1. environment override ($FIREFOX_BINARY, $CHROME_BINARY)
+# 2. well known install locations (macOS app bundles, linux packages, snap, windows)
+# 3. $PATH
+# 4. spotlight, for app bundles in unusual places on macOS
+#
+# The result is memoized per process and cached on disk (see disk_cache.py). The disk cache is validated
+# by the modification time of the executable, so browser updates are noticed without spawning anything.
+
+import os
+import plistlib
+import shutil
+import sys
+from collections import namedtuple
+from functools import lru_cache
+from pathlib import Path
+from subprocess import run
+
+import disk_cache
+from phase_timing import timed
+
+CACHE_NAME = 'browsers'
+
+Browser = namedtuple('Browser', ['name', 'path', 'version'])
+
+BROWSERS = {
+    'Firefox': dict(
+        environment='FIREFOX_BINARY',
+        executables=['firefox', 'firefox-esr'],
+        locations=[
+            '/Applications/Firefox.app/Contents/MacOS/firefox',
+            '~/Applications/Firefox.app/Contents/MacOS/firefox',
+            '/usr/lib/firefox/firefox',
+            '/usr/lib64/firefox/firefox',
+            '/opt/firefox/firefox',
+            '/snap/bin/firefox',
+            'C:/Program Files/Mozilla Firefox/firefox.exe',
+        ],
+    ),
+    'Google Chrome': dict(
+        environment='CHROME_BINARY',
+        executables=['google-chrome', 'google-chrome-stable', 'chromium', 'chromium-browser'],
+        locations=[
+            '/Applications/Google Chrome.app/Contents/MacOS/Google Chrome',
+            '~/Applications/Google Chrome.app/Contents/MacOS/Google Chrome',
+            '/opt/google/chrome/chrome',
+            '/usr/lib/chromium/chromium',
+            '/snap/bin/chromium',
+            'C:/Program Files/Google/Chrome/Application/chrome.exe',
+        ],
+    ),
+}
+
+class BrowserNotFound(Exception):
+    pass
+
+@lru_cache(maxsize=None)
+def find_browser(name):
+    with timed('browser discovery'):
+        return find_browser_uncached(name)
+
+def find_browser_uncached(name):
+    spec = BROWSERS[name]
+    override = os.environ.get(spec['environment'])
+    cache_key = f'{name}={override or ""}'
+    
+    entry = disk_cache.load(CACHE_NAME).get(cache_key)
+    if entry is not None and is_unchanged(entry):
+        return Browser(name, entry['path'], entry['version'])
+    
+    path = override or locate(name, spec)
+    if path is None:
+        raise BrowserNotFound(f'Could not find {name}, set ${spec["environment"]} to the executable')
+    
+    browser = Browser(name, path, read_version(path))
+    with disk_cache.locked(CACHE_NAME):
+        browsers = disk_cache.load(CACHE_NAME)
+        browsers[cache_key] = dict(path=browser.path, version=browser.version, mtime=os.stat(path).st_mtime)
+        disk_cache.store(CACHE_NAME, browsers)
+    return browser
+
+def is_unchanged(entry):
+    try:
+        return os.stat(entry['path']).st_mtime == entry['mtime']
+    except OSError:
+        return False
+
+def locate(name, spec):
+    for location in spec['locations']:
+        path = os.path.expanduser(location)
+        if os.access(path, os.X_OK):
+            return path
+    
+    for executable in spec['executables']:
+        path = shutil.which(executable)
+        if path is not None:
+            return path
+    
+    if 'darwin' == sys.platform:
+        return find_in_app_bundle(name)
+    return None
+
+## macOS
+
+def find_app_bundle(application_name):
+    find_bundle_command = ['mdfind', f'kMDItemFSName == "{application_name}.app"']
+    paths = run(find_bundle_command, capture_output=True).stdout.decode().splitlines()
+    if len(paths) == 0:
+        return None
+    return paths[0].strip()
+
+def find_in_app_bundle(application_name, executable_name=None):
+    bundle_path = find_app_bundle(application_name)
+    if bundle_path is None:
+        return None
+    if executable_name is None:
+        executable_name = read_info_plist(bundle_path)['CFBundleExecutable']
+    return bundle_path + '/Contents/MacOS/' + executable_name
+
+def read_info_plist(bundle_path):
+    with open(bundle_path + '/Contents/Info.plist', 'rb') as file:
+        return plistlib.load(file)
+
+def bundle_of(executable_path):
+    if '.app/Contents/MacOS/' not in executable_path:
+        return None
+    return executable_path.split('/Contents/MacOS/')[0]
+
+## Versions
+
+def read_version(executable_path):
+    "e.g. 'Firefox 101.0.1' or 'Google Chrome 102.0.5005.115'"
+    bundle_path = bundle_of(executable_path)
+    if bundle_path is not None:
+        info = read_info_plist(bundle_path)
+        return f"{info.get('CFBundleName', Path(bundle_path).stem)} {info['CFBundleShortVersionString']}"
+    
+    output = run([executable_path, '--version'], capture_output=True, encoding='utf8').stdout.strip()
+    return output.removeprefix('Mozilla ')
@@ -0,0 +1,95 @@
+# Performance budgets that survive a noisy machine
+#
+#   with performance_budget(seconds=1, operation='reset', repeat=5, warmup=1, statistic='p90') as budget:
+#       for sample in budget:
+#           with sample:
+#               page.reset()
+#
+# The block runs warmup + repeat times, timed with the monotonic nanosecond clock. Warmup rounds are discarded,
+# the budget is checked against the median (or a percentile) of the rest. The whole distribution goes into
+# the test report, whether the budget holds or not, and every sample shows up in `pytest --benchmark`.
+# The check happens when the `with` ends, a loop that stops early fails instead of skipping it.
+
+import statistics
+import time
+
+from benchmark import percentile, record_timing, summarize
+
+BUDGET_PROPERTY = 'budget'
+
+class Sample:
+
+    def __init__(self):
+        self.nanoseconds = None
+    
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+    
+    def __exit__(self, *exception_info):
+        self.nanoseconds = time.perf_counter_ns() - self.start
+
+def statistic_of(samples, statistic):
+    "'median', 'mean', 'min', 'max' or a percentile like 'p90'"
+    if statistic.startswith('p'):
+        return percentile(samples, float(statistic[1:]))
+    return dict(median=statistics.median, mean=statistics.fmean, min=min, max=max)[statistic](samples)
+
+class Budget:
+    "see module comment"
+    
+    def __init__(self, seconds, operation='budget', repeat=5, warmup=1, statistic='median', node=None):
+        if repeat < 1 or warmup < 0:
+            raise ValueError(f'{operation}: needs repeat >= 1 and warmup >= 0, got repeat={repeat}, warmup={warmup}')
+        self.seconds = seconds
+        self.operation = operation
+        self.repeat = repeat
+        self.warmup = warmup
+        self.statistic = statistic
+        self.node = node
+        self.taken = []
+    
+    def __enter__(self):
+        return self
+    
+    def __iter__(self):
+        "warmup + repeat samples, each has to time one execution of the block via `with sample:`"
+        for _ in range(self.warmup + self.repeat):
+            sample = Sample()
+            self.taken.append(sample)
+            yield sample
+            if sample.nanoseconds is None:
+                raise RuntimeError('every sample has to be used as `with sample: …`')
+    
+    @property
+    def rounds(self):
+        "executions timed so far, warmup included"
+        return sum(1 for sample in self.taken if sample.nanoseconds is not None)
+    
+    @property
+    def samples(self):
+        "seconds per measured round"
+        return [sample.nanoseconds / 1e9 for sample in self.taken[self.warmup:] if sample.nanoseconds is not None]
+    
+    def __exit__(self, exception_type, *exception_info):
+        # the test fails anyway, a budget verdict on top would only hide its exception
+        if exception_type is None:
+            self.check()
+    
+    def check(self):
+        "Asserts the budget. With a node, samples and verdict are recorded on it"
+        assert self.warmup + self.repeat == self.rounds, (
+            f'{self.operation}: only {self.rounds} of {self.warmup + self.repeat} rounds ran, '
+            'the loop over the budget must not end early')
+        
+        measured = statistic_of(self.samples, self.statistic)
+        if self.node is not None:
+            for each in self.samples:
+                record_timing(self.node, self.operation, each)
+            self.node.user_properties.append((BUDGET_PROPERTY, dict(
+                operation=self.operation, statistic=self.statistic, budget=self.seconds, measured=measured,
+                **summarize(self.samples))))
+        
+        assert measured < self.seconds, (
+            f'{self.operation}: {self.statistic} of {self.repeat} rounds is {measured:.4f}s, '
+            f'over the budget of {self.seconds}s (samples: {", ".join(f"{each:.4f}" for each in self.samples)})')
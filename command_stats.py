@@ -0,0 +1,156 @@
+# Count and time every protocol command a test sends to the browser
+#
+#   pytest --command-stats commands.json
+#
+# Instruments selenium's RemoteConnection.execute() (selenium, capybara, selene, splinter) and the channel
+# of playwright, through which every call to the playwright driver goes. Per test this records the number
+# of commands, a latency histogram and the slowest commands. That tells apart frameworks that are slow
+# because of their own python overhead from those that are just chatty.
+#
+# Nothing is patched unless the option is given.
+
+import functools
+import heapq
+import json
+import time
+
+import pytest
+
+import session_report
+
+# upper bounds in milliseconds, the last bucket takes everything slower
+HISTOGRAM_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000)
+KEEP_SLOWEST = 10
+
+def pytest_addoption(parser):
+    parser.addoption('--command-stats', default=None, metavar='PATH',
+        help='record count and latency of every webdriver / playwright command per test, write them to PATH')
+
+class Commands:
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0
+        self.by_command = {}
+        self.histogram = [0] * (len(HISTOGRAM_BUCKETS) + 1)
+        self.slowest = []
+    
+    def record(self, protocol, command, seconds):
+        self.count += 1
+        self.seconds += seconds
+        name = f'{protocol}:{command}'
+        count, total = self.by_command.get(name, (0, 0))
+        self.by_command[name] = (count + 1, total + seconds)
+        
+        milliseconds = seconds * 1000
+        bucket = next((index for index, limit in enumerate(HISTOGRAM_BUCKETS) if milliseconds <= limit), -1)
+        self.histogram[bucket] += 1
+        
+        # min heap, so the fastest of the slowest is the one that gets kicked out
+        entry = (seconds, self.count, name)
+        if len(self.slowest) < KEEP_SLOWEST:
+            heapq.heappush(self.slowest, entry)
+        else:
+            heapq.heappushpop(self.slowest, entry)
+    
+    def as_dict(self):
+        return dict(
+            count=self.count,
+            seconds=self.seconds,
+            by_command={name: dict(count=count, seconds=seconds) for name, (count, seconds) in self.by_command.items()},
+            histogram={f'<={limit}ms': count for limit, count in zip(HISTOGRAM_BUCKETS, self.histogram)}
+                | {f'>{HISTOGRAM_BUCKETS[-1]}ms': self.histogram[-1]},
+            slowest=[dict(command=name, seconds=seconds, index=index)
+                for seconds, index, name in sorted(self.slowest, reverse=True)],
+        )
+
+# commands of the currently running test, None outside of tests
+current = None
+
+def record(protocol, command, seconds):
+    if current is not None:
+        current.record(protocol, command, seconds)
+
+## Instrumentation
+
+def instrument_selenium():
+    try:
+        from selenium.webdriver.remote.remote_connection import RemoteConnection
+    except ImportError:
+        return
+    
+    original = RemoteConnection.execute
+    
+    @functools.wraps(original)
+    def execute(self, command, params):
+        start = time.perf_counter()
+        try:
+            return original(self, command, params)
+        finally:
+            record('webdriver', command, time.perf_counter() - start)
+    
+    RemoteConnection.execute = execute
+
+def instrument_playwright():
+    try:
+        from playwright._impl._connection import Channel
+    except ImportError:
+        return
+    
+    # private api, but every sync and async call ends up here
+    original = Channel.inner_send
+    
+    @functools.wraps(original)
+    async def inner_send(self, method, params, return_as_dict):
+        start = time.perf_counter()
+        try:
+            return await original(self, method, params, return_as_dict)
+        finally:
+            record('playwright', f'{getattr(self._object, "_type", "?")}.{method}', time.perf_counter() - start)
+    
+    Channel.inner_send = inner_send
+
+## Plugin
+
+def without_nodeid(test):
+    return {key: value for key, value in test.items() if 'nodeid' != key}
+
+def pytest_configure(config):
+    if config.getoption('command_stats') is None:
+        return
+    
+    instrument_selenium()
+    instrument_playwright()
+    config.pluginmanager.register(CommandStats(), 'command-stats')
+
+class CommandStats:
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_protocol(self, item):
+        global current
+        current = Commands()
+        try:
+            yield
+        finally:
+            commands, current = current, None
+            session_report.record(item.config, 'command_stats', nodeid=item.nodeid, **commands.as_dict())
+    
+    def pytest_sessionfinish(self, session):
+        config = session.config
+        if hasattr(config, 'workeroutput'):
+            return
+        
+        tests = session_report.sections(config).get('command_stats', [])
+        with open(config.getoption('command_stats'), 'w') as file:
+            json.dump({test['nodeid']: without_nodeid(test) for test in tests}, file, indent=2)
+    
+    def pytest_terminal_summary(self, terminalreporter, config):
+        tests = session_report.sections(config).get('command_stats', [])
+        if not tests:
+            return
+        
+        terminalreporter.write_sep('=', 'protocol commands')
+        for test in sorted(tests, key=lambda test: test['count'], reverse=True)[:10]:
+            terminalreporter.write_line(
+                f"{test['count']:5d} commands {test['seconds']:7.3f}s  {test['nodeid']}")
+        terminalreporter.write_line(f'full statistics in {config.getoption("command_stats")}')
@@ -2,7 +2,24 @@ import subprocess
 import pytest
 import re
 import atexit
-from subprocess import run
+import functools
+import shutil
+import warnings
+from pathlib import Path
+
+# plugins are imported by the helpers below already, their asserts only get rewritten when registered first
+pytest_plugins = ['benchmark', 'session_report', 'readiness', 'command_stats', 'phase_timing', 'baselines', 'recording']
+pytest.register_assert_rewrite(*pytest_plugins)
+
+import artifact_store
+import file_formats
+import visual_diff
+from app_server import serving
+from budget import Budget
+from locators import XPathLibrary
+from browser_discovery import find_browser, find_in_app_bundle
+from readiness import OutputWatcher, http_ok, selenium_grid_ready, wait_until_ready
+from workers import docker_compose, docker_compose_environment, port
 
 ## Locating browsers
 
@@ -13,43 +30,40 @@ def find_chrome():
     return find_application('Google Chrome')
 
 def find_application(application_name, executable_name=None):
-    find_bundle_command = ['mdfind', f'kMDItemFSName == "{application_name}.app"']
-    extract_command = ['plutil', '-extract', 'CFBundleExecutable', 'raw', '-o', '-']
-    paths = run(find_bundle_command, capture_output=True).stdout.decode().splitlines()
-    
-    assert len(paths) > 0
-    bundle_path = paths[0].strip()
-    info_plist_path = bundle_path + '/Contents/Info.plist'
-    if executable_name is None:
-        executable_name = run(extract_command + [info_plist_path], capture_output=True).stdout.decode().splitlines()[0]
-    return bundle_path + '/Contents/MacOS/' + executable_name
+    "resolved once and cached on disk, see browser_discovery.py"
+    if executable_name is not None:
+        return find_in_app_bundle(application_name, executable_name)
+    return find_browser(application_name).path
+
+@pytest.fixture(scope='session')
+def browser_executable(browser_vendor):
+    "path and version of the local browser, None for browsers that are not started from an executable"
+    applications = {
+        'firefox': 'Firefox',
+        'chrome': 'Google Chrome',
+    }
+    if browser_vendor not in applications:
+        return None
+    return find_browser(applications[browser_vendor])
 
 ## Interacting with Flask
 
 @pytest.fixture(scope='session')
-def flask_uri(browser_vendor):
-    with subprocess.Popen(['flask', 'run', '--reload'], stderr=subprocess.PIPE, encoding='utf8') as process:
-        flask_url = None
-        still_starting = True
-        while still_starting:
-            output = process.stderr.readline()
-            match = re.match(r'^.* Running on (http://[\d\.\:]+).*$', output)
-            still_starting = match is None
-                
-        flask_url = match.group(1)
-        
-        @atexit.register
-        def kill():
-            process.terminate()
-            process.wait()
-        
-        if 'remote-' not in browser_vendor:
+def flask_uri(browser_vendor, request):
+    from app import app
+    
+    timeout = request.config.getoption('service_timeout')
+    keep_alive = 'keep-alive' == request.config.getoption('app_server')
+    if 'remote-' not in browser_vendor:
+        with serving(app, keep_alive=keep_alive) as flask_url:
+            wait_until_ready('flask', lambda: http_ok(flask_url), timeout)
             yield flask_url
-        else:
+    else:
+        # the browser runs in docker and reaches the host via host.docker.internal, so listen on all interfaces
+        with serving(app, host='0.0.0.0', keep_alive=keep_alive) as flask_url:
+            wait_until_ready('flask', lambda: http_ok(flask_url), timeout)
             protocol, host, port = flask_url.split(':')
             yield ':'.join([protocol, '//host.docker.internal', port])
-        
-        kill()
 
 def add_auth_to_uri(uri, username, password):
     import urllib
@@ -81,43 +95,92 @@ def force_open_shadow_dom_script():
 
 ## Test helpers and assertions
 
-# Selenium style xpath matcher
-@pytest.fixture
+# users driven by test_drive_many_contexts_concurrently, in the sync and the async playwright suite alike
+CONCURRENT_USERS = 8
+
+# Selenium style xpath matcher, renders every distinct expression only once
+@pytest.fixture(scope='session')
 def xpath():
-    class XPath:
-        def __getattr__(self, name):
-            from xpath import html
-            from xpath.renderer import to_xpath
-            
-            def callable(*args, **kwargs):
-                return to_xpath(getattr(html, name)(*args, **kwargs))
-            
-            return callable
-    
-    return XPath()
+    return XPathLibrary()
 
 
 def assert_is_png(path):
-    assert_is_file(path, '.png', b'PNG image data', b'8-bit/color RGBA, non-interlaced')
+    assert_is_file(path, '.png')
+    info = file_formats.png_info(path)
+    assert (8, 'RGBA', False) == (info.bit_depth, info.color_type, info.interlaced)
+
+def assert_is_webm(path):
+    assert_is_file(path, '.webm')
+    assert 'webm' == file_formats.webm_doctype(path)
+
+def assert_is_zip(path):
+    assert_is_file(path, '.zip')
+    assert len(file_formats.zip_names(path)) > 0
+
+def assert_is_har(path):
+    assert_is_file(path, '.har')
+    assert file_formats.har_info(path).entries > 0
 
-def assert_is_file(path, expected_suffix, *expected_file_outputs):
+def assert_is_file(path, expected_suffix):
     assert path.exists() and path.is_file()
     assert path.stat().st_size > 1000
     assert path.suffix == expected_suffix
+
+@pytest.fixture
+def assert_screenshot(request, tmp_path):
+    """
+    `assert_screenshot(png, name, threshold=.1, tolerance=0, masks=())` compares png bytes (or a file)
+    against the baseline `name` of the current test, see visual_diff.py.
+    A missing baseline fails the test, `--update-screenshots` writes it (and rewrites existing ones),
+    the baselines are committed along with the tests.
+    Byte identical screenshots pass without being decoded.
+    On a mismatch, actual, expected and a diff heatmap end up in the tmp_path of the test.
+    """
+    config = request.config
+    baselines = Path(config.getoption('screenshot_baselines') or config.rootpath / 'screenshot_baselines')
+    # the benchmark round doesn't change what a page looks like, all rounds share one baseline
+    callspec = getattr(request.node, 'callspec', None)
+    parameters = [str(value) for name, value in callspec.params.items() if 'benchmark_round' != name] if callspec else []
+    test_name = re.sub(r'[^\w.-]+', '_', '-'.join([request.node.originalname] + parameters))
     
-    import subprocess
-    output = subprocess.check_output(['file', path])
-    for expected_output in expected_file_outputs:
-        assert re.search(expected_output, output)
-
-from contextlib import contextmanager
-from datetime import datetime
-@contextmanager
-def assert_no_slower_than(seconds=1):
-    before = datetime.now()
-    yield
-    after = datetime.now()
-    assert (after - before).total_seconds() < seconds
+    def assert_screenshot(png, name, threshold=.1, tolerance=0, masks=()):
+        baseline = baselines / request.node.path.stem / f'{test_name}-{name}.png'
+        if config.getoption('update_screenshots'):
+            if not baseline.exists():
+                warnings.warn(f'new screenshot baseline {baseline}')
+            baseline.parent.mkdir(parents=True, exist_ok=True)
+            # the original bytes, so identical screenshots are recognized by their hash next time
+            if isinstance(png, (bytes, bytearray)):
+                baseline.write_bytes(png)
+            else:
+                shutil.copyfile(png, baseline)
+            return
+        if not baseline.exists():
+            pytest.fail(f'{name}: no screenshot baseline {baseline}, run with --update-screenshots to create it')
+        if artifact_store.same_content(png, baseline):
+            return
+        
+        difference = visual_diff.compare(png, baseline, threshold=threshold, masks=masks)
+        if not visual_diff.matches(difference, tolerance):
+            visual_diff.save_png(difference.actual, tmp_path / f'{name}-actual.png')
+            visual_diff.save_png(difference.expected, tmp_path / f'{name}-expected.png')
+            visual_diff.save_png(visual_diff.heatmap(difference, threshold), tmp_path / f'{name}-diff.png')
+        assert visual_diff.matches(difference, tolerance), (
+            f'{name}: {difference.pixels} pixels ({difference.ratio:.2%}) differ from {baseline}, see {tmp_path}')
+    
+    return assert_screenshot
+
+@pytest.fixture(scope='session')
+def artifacts(request):
+    "stores screenshots and traces once per content, see artifact_store.py"
+    store = artifact_store.ArtifactStore(request.config.getoption('artifact_store'))
+    yield store
+    store.prune()
+
+@pytest.fixture
+def performance_budget(request):
+    "`Budget` that records its samples on the current test"
+    return functools.partial(Budget, node=request.node)
 
 ## pytest customization to add multi browser support
 
@@ -126,6 +189,17 @@ def pytest_addoption(parser):
         'all', 'firefox', 'chrome', 'safari', 'remote-selenium', 'remote-playwright'
     ))
     parser.addoption("--headless", default=False, action='store_true', help='default: false')
+    parser.addoption("--driver-max-uses", default=20, type=int,
+        help='recycle pooled selenium drivers after this many tests, 1 starts a new browser per test. default: 20')
+    parser.addoption("--app-server", default='keep-alive', choices=('keep-alive', 'simple'),
+        help='keep-alive: HTTP/1.1 with persistent connections, simple: a connection per request. default: keep-alive')
+    parser.addoption("--screenshot-baselines", default=None,
+        help='directory of the baselines of assert_screenshot(). default: screenshot_baselines/ next to conftest.py')
+    parser.addoption("--update-screenshots", default=False, action='store_true',
+        help='write the current screenshots as new baselines instead of comparing. default: false')
+    parser.addoption("--artifact-store", default=None,
+        help='directory that keeps one copy per screenshot / trace content, best on the file system of the tmp dirs. '
+            'default: browser-automation-artifacts in the system temp dir')
 
 def pytest_generate_tests(metafunc):
     if "browser_vendor" in metafunc.fixturenames:
@@ -142,11 +216,16 @@ def is_headless(request):
 # also skipif is evaluated before the fixture, which means the side effect of the fixture cannot be used
 # Thus special implementation is needed to graft this functionality on top of pytest
 # inspired by https://stackoverflow.com/questions/28179026/how-to-skip-a-pytest-using-an-external-fixture
-# This has the unfortunate side effect of forcing each test to be parametrized by browser vendor. 
-# Not a problem if that is required / wanted anyway, but not super nice.
+# The vendor is only looked up for tests that depend on it anyway, requesting it as an argument
+# would parametrize every test by browser vendor, even the ones that never start a browser.
+def browser_vendor_of(request):
+    if 'browser_vendor' not in request.fixturenames:
+        return None
+    return request.getfixturevalue('browser_vendor')
+
 @pytest.fixture(autouse=True)
-def skip_or_xfail_safari(request, browser_vendor):
-    if 'safari' != browser_vendor:
+def skip_or_xfail_safari(request):
+    if 'safari' != browser_vendor_of(request):
         return
     
     def reason(marker_name):
@@ -155,13 +234,13 @@ def skip_or_xfail_safari(request, browser_vendor):
     if request.node.get_closest_marker('xfail_safari'):
         # add a normal xfail marker, to allow the test to execute
         request.node.add_marker(pytest.mark.xfail(reason=reason('xfail_safari')))
-        
+    
     if request.node.get_closest_marker('skipif_safari'):
         return pytest.skip(msg=reason('skipif_safari'))
 
 @pytest.fixture(autouse=True)
-def skip_or_xfail_firefox(request, browser_vendor):
-    if 'firefox' != browser_vendor:
+def skip_or_xfail_firefox(request):
+    if 'firefox' != browser_vendor_of(request):
         return
     
     def reason(marker_name):
@@ -170,79 +249,66 @@ def skip_or_xfail_firefox(request, browser_vendor):
     if request.node.get_closest_marker('xfail_firefox'):
         # add a normal xfail marker, to allow the test to execute
         request.node.add_marker(pytest.mark.xfail(reason=reason('xfail_firefox')))
-        
+    
     if request.node.get_closest_marker('skipif_firefox'):
         return pytest.skip(msg=reason('skipif_firefox'))
 
+## Running browsers in docker
+
+def selenium_grid_url():
+    return f'http://localhost:{port("selenium-grid")}'
 
-def run_selenium_in_docker_if_neccessary(browser_vendor, docker_compose_target):
+def run_selenium_in_docker_if_neccessary(browser_vendor, docker_compose_target, timeout):
     if 'remote-selenium' != browser_vendor:
         yield
         return
     
-    import subprocess
-    import requests
-    import time
-    
-    def selenium_grid_is_up():
-        try:
-            return requests.get('http://localhost:4444/wd/hub/status').json()['value']['ready']
-        except requests.ConnectionError:
-            return False
-    
-    def wait_for_selenium_grid():
-        while not selenium_grid_is_up():
-            time.sleep(.2)
-    
-    subprocess.run(['docker', 'compose', 'up', '-d', docker_compose_target])
-    wait_for_selenium_grid()
+    subprocess.run(docker_compose('up', '-d', docker_compose_target), env=docker_compose_environment())
     try:
+        wait_until_ready(docker_compose_target, lambda: selenium_grid_ready(selenium_grid_url()), timeout)
         yield
     finally:
         # stopping `docker compose` gracefully via signals doesn't seem to work at all
         # especially SIGTERM should have worked, as that is what gets sent on ctrl-c
-        subprocess.run(['docker', 'compose', 'stop', docker_compose_target])
+        subprocess.run(docker_compose('stop', docker_compose_target), env=docker_compose_environment())
 
 @pytest.fixture(scope='session')
-def run_selenium_firefox_in_docker_if_neccessary(browser_vendor):
-    yield from run_selenium_in_docker_if_neccessary(browser_vendor, 'selenium-firefox')
+def run_selenium_firefox_in_docker_if_neccessary(browser_vendor, request):
+    yield from run_selenium_in_docker_if_neccessary(
+        browser_vendor, 'selenium-firefox', request.config.getoption('service_timeout'))
 
 @pytest.fixture(scope='session')
-def run_selenium_chrome_in_docker_if_neccessary(browser_vendor):
-    yield from run_selenium_in_docker_if_neccessary(browser_vendor, 'selenium-chrome')
+def run_selenium_chrome_in_docker_if_neccessary(browser_vendor, request):
+    yield from run_selenium_in_docker_if_neccessary(
+        browser_vendor, 'selenium-chrome', request.config.getoption('service_timeout'))
 
 @pytest.fixture(scope='session')
-def run_playwright_chrome_in_docker_if_neccessary(browser_vendor):
+def run_playwright_chrome_in_docker_if_neccessary(browser_vendor, request):
     if 'remote-playwright' != browser_vendor:
         yield
         return
     
-    with subprocess.Popen(
-        ['docker', 'compose', 'run', '--service-ports', 'playwright-remote'], 
-        stdout=subprocess.PIPE, stderr=subprocess.PIPE, encoding='utf8'
-    ) as process:
-        @atexit.register
-        def kill():
-            process.terminate()
-            process.wait()
-
-        playwright_url = None
-        still_starting = True
-        while still_starting:
-            output = process.stdout.readline()
-            print(f'{output=}')
-            # example ws://127.0.0.1:2342/143c3727b691bceeb8bbeb349715452c
-            match = re.match(r'^.*(ws://[\d\.\:]+/\w+).*$', output)
-            still_starting = match is None
+    process = subprocess.Popen(
+        docker_compose('run', '--service-ports', 'playwright-remote'), env=docker_compose_environment(),
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT, encoding='utf8'
+    )
+    @atexit.register
+    def kill():
+        process.terminate()
+        process.wait()
+    
+    # example ws://127.0.0.1:2342/143c3727b691bceeb8bbeb349715452c
+    output = OutputWatcher(process.stdout, r'ws://[\d\.\:]+/\w+')
+    match = wait_until_ready('playwright-remote', output.match, request.config.getoption('service_timeout'),
+        process=process, details=output.tail)
     
-    playwright_url = match.group(1)
-    print(f'{playwright_url=}')
+    # the server inside the container always listens on 2342, but docker publishes it on the port of this worker
+    playwright_url = re.sub(r':\d+/', f':{port("playwright-server")}/', match.group(0))
     
     try:
         from collections import namedtuple
         CDP = namedtuple('ChromeDevToolProtocol', ['url'])
         yield CDP(url=playwright_url)
     finally:
-        subprocess.run(['docker', 'compose', 'stop', 'playwright-remote'])
+        subprocess.run(docker_compose('stop', 'playwright-remote'), env=docker_compose_environment())
         kill()
-        
\ No newline at end of file
@@ -0,0 +1,47 @@
+# Tiny json file cache for things that are expensive to find out but rarely change (driver and browser paths)
+#
+# Lives in ~/.cache/browser-automation-comparison, override with $BROWSER_AUTOMATION_CACHE_DIR
+
+import json
+import os
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:
+    # no file locking on windows, parallel workers may do duplicate work there
+    fcntl = None
+
+def cache_dir():
+    default = Path.home() / '.cache' / 'browser-automation-comparison'
+    path = Path(os.environ.get('BROWSER_AUTOMATION_CACHE_DIR', default))
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+def load(name):
+    try:
+        with open(cache_dir() / f'{name}.json') as file:
+            return json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def store(name, data):
+    path = cache_dir() / f'{name}.json'
+    # write and rename, so concurrent readers never see a half written file
+    temporary_path = path.with_suffix(f'.{os.getpid()}.tmp')
+    with open(temporary_path, 'w') as file:
+        json.dump(data, file, indent=2)
+    os.replace(temporary_path, path)
+
+@contextmanager
+def locked(name):
+    "Exclusive lock across processes, e.g. so parallel workers don't download the same driver at the same time"
+    with open(cache_dir() / f'{name}.lock', 'w') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
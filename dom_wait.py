@@ -0,0 +1,113 @@
+# Waiting for the dom without polling it
+#
+# WebDriverWait asks the browser every 500ms whether the condition holds yet, so a change is noticed up to
+# half a second late, and every poll is a round trip. Instead this installs a MutationObserver in the page via
+# execute_async_script, which checks the condition right after every dom change and answers as soon as it holds.
+# Conditions that become true without touching the dom (scrolling, styles, time) are rechecked on a timer too.
+#
+#   wait_for(driver, located((By.ID, 'outer'), (By.XPATH, './/*[@id="inner"]')), timeout=2)
+#
+# Conditions are javascript, as they have to run in the page. Where async scripts are not available
+# (or the page navigates away while waiting), the same condition is polled via execute_script instead.
+
+import time
+import weakref
+from collections import namedtuple
+
+from selenium.common.exceptions import (
+    JavascriptException, TimeoutException, UnknownMethodException, WebDriverException,
+)
+from selenium.webdriver.support.ui import WebDriverWait
+
+import locator_chain
+
+# where async scripts don't work, not to be confused with WebDriverWait's POLL_FREQUENCY of .5
+FALLBACK_POLL_INTERVAL = .05
+# the observer covers dom changes, this only catches conditions that change without one
+RECHECK_INTERVAL = .1
+
+Condition = namedtuple('Condition', ['source', 'args', 'description'])
+# detected: when the page noticed the condition, on the page clock (performance.timeOrigin + performance.now()).
+# None when polled. Against the time of the change that is the latency of the observer itself, see wait_latency.py
+Waited = namedtuple('Waited', ['value', 'seconds', 'detected', 'mutations', 'push'])
+
+# arguments: condition source, condition args, timeout in ms, recheck interval in ms, callback
+WAIT_SCRIPT = '''
+const [source, args, timeout, interval, done] = arguments
+const condition = new Function(`return (${source})`)()
+const check = () => condition(...args)
+const now = () => performance.timeOrigin + performance.now()
+
+const first = check()
+if (first) {
+    return done({ value: first, detected: now(), mutations: 0 })
+}
+
+let mutations = 0
+const finish = value => {
+    const detected = now()
+    observer.disconnect()
+    clearTimeout(timer)
+    clearInterval(recheck)
+    done({ value, detected, mutations })
+}
+const checkAndFinish = () => {
+    const value = check()
+    if (value) {
+        finish(value)
+    }
+}
+const observer = new MutationObserver(() => {
+    mutations += 1
+    checkAndFinish()
+})
+observer.observe(document, { childList: true, subtree: true, attributes: true, characterData: true })
+const recheck = setInterval(checkAndFinish, interval)
+const timer = setTimeout(() => finish(null), timeout)
+'''
+
+def located(*steps):
+    "element found by a locator chain, see locator_chain.compile()"
+    chain = locator_chain.compile(*steps)
+    return Condition(f'(steps) => ({locator_chain.RESOLVE})(steps).element', [chain.steps], repr(chain))
+
+def script(source, *args, description=None):
+    "any javascript function returning something truthy once the condition holds"
+    return Condition(source, list(args), description or source)
+
+# drivers that can't run async scripts at all, they get polled for as long as they live (pooled ones for many tests)
+polled_drivers = weakref.WeakSet()
+
+def is_unsupported(error):
+    if isinstance(error, UnknownMethodException):
+        return True
+    message = (error.msg or '').lower()
+    return 'unknown command' in message or 'unsupported operation' in message
+
+def wait_for(driver, condition, timeout):
+    "Waited with the first truthy value of the condition, raises TimeoutException"
+    start = time.perf_counter()
+    message = f'{condition.description} not true after {timeout}s'
+    if driver not in polled_drivers:
+        try:
+            result = driver.execute_async_script(
+                WAIT_SCRIPT, condition.source, condition.args, timeout * 1000, RECHECK_INTERVAL * 1000)
+        except TimeoutException as error:
+            # the driver gave up before the page did, its script timeout is shorter than the wait
+            raise TimeoutException(message) from error
+        except JavascriptException:
+            # navigation while waiting unloads the observer, poll for the rest of the time
+            pass
+        except WebDriverException as error:
+            if is_unsupported(error):
+                polled_drivers.add(driver)
+            # anything else (an alert, a closed window) may be gone next time, poll just this once
+        else:
+            if result['value'] is None:
+                raise TimeoutException(message)
+            return Waited(result['value'], time.perf_counter() - start, result['detected'], result['mutations'], push=True)
+    
+    remaining = max(timeout - (time.perf_counter() - start), 0)
+    value = WebDriverWait(driver, remaining, poll_frequency=FALLBACK_POLL_INTERVAL).until(
+        lambda driver: driver.execute_script(f'return ({condition.source})(...arguments)', *condition.args), message)
+    return Waited(value, time.perf_counter() - start, None, None, push=False)
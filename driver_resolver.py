@@ -0,0 +1,78 @@
+# Resolve webdriver executables (geckodriver, chromedriver) once and remember them
+#
+# webdriver_manager asks the GitHub API on every `install()` (hence the GH_TOKEN) and re-validates its cache.
+# Here the resolved path is memoized per process and persisted on disk keyed by browser and browser version,
+# so only a browser update triggers another download.
+#
+# Set WEBDRIVER_OFFLINE=1 to never touch the network. Then drivers come from the disk cache or from $PATH.
+# Drivers found on $PATH are not cached, whatever is there may change with any package upgrade.
+
+import os
+import shutil
+from functools import lru_cache
+
+import disk_cache
+from phase_timing import timed
+
+CACHE_NAME = 'drivers'
+
+DRIVER_EXECUTABLES = {
+    'firefox': 'geckodriver',
+    'chrome': 'chromedriver',
+}
+
+class DriverNotAvailable(Exception):
+    pass
+
+def is_offline():
+    return os.environ.get('WEBDRIVER_OFFLINE', '') not in ('', '0')
+
+@lru_cache(maxsize=None)
+def resolve_driver(browser_name, version):
+    with timed('driver resolution'):
+        return resolve_driver_uncached(browser_name, version)
+
+def resolve_driver_uncached(browser_name, version):
+    key = f'{browser_name} {version}'
+    path = cached_driver(key)
+    if path is not None:
+        return path
+    if is_offline():
+        return driver_on_path(browser_name)
+    
+    with disk_cache.locked(CACHE_NAME):
+        # another worker may have finished the download while we were waiting for the lock
+        path = cached_driver(key)
+        if path is not None:
+            return path
+        
+        path = download_driver(browser_name)
+        drivers = disk_cache.load(CACHE_NAME)
+        drivers[key] = path
+        disk_cache.store(CACHE_NAME, drivers)
+        return path
+
+def cached_driver(key):
+    path = disk_cache.load(CACHE_NAME).get(key)
+    if path is None or not os.path.exists(path):
+        return None
+    return path
+
+def driver_on_path(browser_name):
+    path = shutil.which(DRIVER_EXECUTABLES[browser_name])
+    if path is None:
+        raise DriverNotAvailable(
+            f'WEBDRIVER_OFFLINE is set, but no cached {DRIVER_EXECUTABLES[browser_name]} '
+            f'and none on $PATH. Run once with network access or install the driver.'
+        )
+    return path
+
+def download_driver(browser_name):
+    # imported late, so offline runs don't even need to import the network stack of webdriver_manager
+    if 'firefox' == browser_name:
+        from webdriver_manager.firefox import GeckoDriverManager
+        return GeckoDriverManager().install()
+    if 'chrome' == browser_name:
+        from webdriver_manager.chrome import ChromeDriverManager
+        return ChromeDriverManager().install()
+    raise DriverNotAvailable(f'No driver known for {browser_name}')
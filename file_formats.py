@@ -0,0 +1,214 @@
+# Is this screenshot / video / trace / har what it claims to be?
+#
+# Pure python replacements for running `file` on every artifact, which costs a process spawn per check
+# and gives different answers depending on the version installed (the one in the docker image doesn't know json).
+# Every check reads only what it needs: 33 bytes of a png, the EBML header of a webm, the central directory of a zip.
+# Har files are streamed, so even huge recordings don't end up in memory at once.
+
+import json
+import struct
+import zipfile
+import zlib
+from collections import namedtuple
+
+class InvalidFile(ValueError):
+    pass
+
+## PNG
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+PNG_COLOR_TYPES = {0: 'grayscale', 2: 'RGB', 3: 'colormap', 4: 'gray+alpha', 6: 'RGBA'}
+
+PngInfo = namedtuple('PngInfo', ['width', 'height', 'bit_depth', 'color_type', 'interlaced'])
+
+def png_info(path):
+    "signature and IHDR chunk, which the spec requires to come first"
+    with open(path, 'rb') as file:
+        head = file.read(len(PNG_SIGNATURE) + 4 + 4 + 13 + 4)
+    
+    if not head.startswith(PNG_SIGNATURE):
+        raise InvalidFile(f'{path}: no png signature')
+    if len(head) < 33:
+        raise InvalidFile(f'{path}: png truncated after {len(head)} bytes')
+    length, chunk_type = struct.unpack('>I4s', head[8:16])
+    if b'IHDR' != chunk_type or 13 != length:
+        raise InvalidFile(f'{path}: png does not start with an IHDR chunk')
+    data, (crc,) = head[16:29], struct.unpack('>I', head[29:33])
+    if zlib.crc32(chunk_type + data) != crc:
+        raise InvalidFile(f'{path}: png IHDR chunk has a bad checksum')
+    
+    width, height, bit_depth, color_type, _compression, _filter, interlace = struct.unpack('>IIBBBBB', data)
+    if 0 == width or 0 == height or color_type not in PNG_COLOR_TYPES:
+        raise InvalidFile(f'{path}: png IHDR is nonsense ({width}x{height}, color type {color_type})')
+    return PngInfo(width, height, bit_depth, PNG_COLOR_TYPES[color_type], 1 == interlace)
+
+## WebM
+
+EBML_MAGIC = b'\x1a\x45\xdf\xa3'
+EBML_DOCTYPE = 0x4282
+
+def read_vint(data, offset, keep_marker=False):
+    "EBML variable length integer, the number of leading zero bits of the first byte tells the length"
+    if offset >= len(data) or 0 == data[offset]:
+        raise InvalidFile('truncated or invalid EBML number')
+    length = 8 - data[offset].bit_length() + 1
+    if offset + length > len(data):
+        raise InvalidFile('truncated EBML number')
+    value = int.from_bytes(data[offset:offset + length], 'big')
+    if not keep_marker:
+        value &= (1 << (7 * length)) - 1
+    return value, offset + length
+
+def webm_doctype(path):
+    "DocType from the EBML header, 'webm' for webm files, 'matroska' for mkv"
+    with open(path, 'rb') as file:
+        head = file.read(64)
+        if not head.startswith(EBML_MAGIC):
+            raise InvalidFile(f'{path}: no EBML header')
+        size, offset = read_vint(head, len(EBML_MAGIC))
+        # the header is tiny, but the size may in theory be anything
+        if offset + size > len(head):
+            head += file.read(offset + size - len(head))
+    
+    end = offset + size
+    while offset < end:
+        element_id, offset = read_vint(head, offset, keep_marker=True)
+        element_size, offset = read_vint(head, offset)
+        if EBML_DOCTYPE == element_id:
+            return head[offset:offset + element_size].rstrip(b'\0').decode('ascii')
+        offset += element_size
+    raise InvalidFile(f'{path}: EBML header without DocType')
+
+## ZIP
+
+def zip_names(path):
+    "names of all members, zipfile only reads the end of central directory record and the central directory"
+    try:
+        with zipfile.ZipFile(path) as archive:
+            return archive.namelist()
+    except zipfile.BadZipFile as error:
+        raise InvalidFile(f'{path}: {error}') from error
+
+## HAR
+
+class JsonStream:
+    """
+    Just enough of an incremental json reader to walk the outer structure of a document
+    and decode the values inside it one at a time.
+    """
+    
+    def __init__(self, file, chunk_size=64 * 1024):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.position = 0
+        self.at_end = False
+        self.decoder = json.JSONDecoder()
+    
+    def fill(self, size=None):
+        chunk = self.file.read(size or self.chunk_size)
+        if not chunk:
+            self.at_end = True
+            return False
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+        return True
+    
+    def peek(self):
+        "next non whitespace character, '' at the end of the file"
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position] in ' \t\r\n':
+                self.position += 1
+            if self.position < len(self.buffer) or not self.fill():
+                return self.buffer[self.position:self.position + 1]
+    
+    def expect(self, *characters):
+        character = self.peek()
+        if character not in characters:
+            raise InvalidFile(f'expected one of {characters!r}, found {character!r}')
+        self.position += 1
+        return character
+    
+    def more(self):
+        # every retry decodes the value from its start, so the buffered part of it at least doubles,
+        # otherwise a single big value (say a response body in a har) would take quadratic time
+        return self.fill(max(self.chunk_size, len(self.buffer) - self.position))
+    
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError as error:
+                if self.at_end or not self.more():
+                    raise InvalidFile(f'invalid json: {error}') from error
+                continue
+            # a number at the end of the buffer may continue in the next chunk
+            if end == len(self.buffer) and not self.at_end and self.more():
+                continue
+            self.position = end
+            return value
+    
+    def members(self):
+        "iterate the keys of an object, the caller has to consume each value"
+        self.expect('{')
+        if '}' == self.peek():
+            self.position += 1
+            return
+        while True:
+            key = self.value()
+            if not isinstance(key, str):
+                raise InvalidFile(f'expected an object key, found {key!r}')
+            self.expect(':')
+            yield key
+            if '}' == self.expect(',', '}'):
+                return
+    
+    def items(self):
+        "iterate the elements of an array, decoding each one"
+        self.expect('[')
+        if ']' == self.peek():
+            self.position += 1
+            return
+        while True:
+            yield self.value()
+            if ']' == self.expect(',', ']'):
+                return
+
+HarInfo = namedtuple('HarInfo', ['version', 'creator', 'pages', 'entries'])
+HAR_ENTRY_KEYS = {'startedDateTime', 'time', 'request', 'response'}
+
+def har_info(path):
+    "walks the file once, validating the structure of the log and every entry without holding all of them"
+    version = creator = None
+    pages = entries = 0
+    with open(path, encoding='utf-8') as file:
+        stream = JsonStream(file)
+        try:
+            for key in stream.members():
+                if 'log' != key:
+                    stream.value()
+                    continue
+                for key in stream.members():
+                    if 'version' == key:
+                        version = stream.value()
+                    elif 'creator' == key:
+                        creator = stream.value().get('name')
+                    elif 'pages' == key:
+                        pages = sum(1 for page in stream.items())
+                    elif 'entries' == key:
+                        for entry in stream.items():
+                            missing = HAR_ENTRY_KEYS - entry.keys()
+                            if missing:
+                                raise InvalidFile(f'entry {entries} is missing {sorted(missing)}')
+                            entries += 1
+                    else:
+                        stream.value()
+            if '' != stream.peek():
+                raise InvalidFile('trailing data after the log')
+        except (InvalidFile, AttributeError) as error:
+            raise InvalidFile(f'{path}: {error}') from error
+    
+    if not isinstance(version, str) or not creator:
+        raise InvalidFile(f'{path}: har without log.version or log.creator.name')
+    return HarInfo(version, creator, pages, entries)
@@ -0,0 +1,52 @@
+# Where are elements, and can the user see them?
+#
+# Viewport size, scroll offsets, the element rect and in-viewport / occlusion status,
+# for one or many elements in a single browser call. Against a remote grid every round trip costs,
+# and the naive way (window.innerHeight, innerWidth, scrollY, scrollX, getBoundingClientRect()) needs five.
+
+from collections import namedtuple
+
+Geometry = namedtuple('Geometry', ['viewport', 'scroll', 'rect', 'in_viewport', 'occluded'])
+
+GEOMETRY_FUNCTION = '''(elements) => {
+    const viewport = { width: window.innerWidth, height: window.innerHeight }
+    const scroll = { x: window.scrollX, y: window.scrollY }
+    return elements.map(element => {
+        // relative to the viewport already, no need to account for scrolling
+        const { top, left, bottom, right, width, height } = element.getBoundingClientRect()
+        const in_viewport = width > 0 && height > 0
+            && bottom > 0 && right > 0 && top < viewport.height && left < viewport.width
+        
+        // occluded if something else is on top of the center of the visible part of the element
+        // null if that cannot be checked because the element is not in the viewport
+        let occluded = null
+        if (in_viewport) {
+            const x = (Math.max(left, 0) + Math.min(right, viewport.width)) / 2
+            const y = (Math.max(top, 0) + Math.min(bottom, viewport.height)) / 2
+            // elements inside a shadow dom are only found when asking their shadow root
+            const root = element.getRootNode().elementFromPoint ? element.getRootNode() : document
+            const hit = root.elementFromPoint(x, y)
+            occluded = ! (hit && (hit === element || element.contains(hit)))
+        }
+        return { viewport, scroll, rect: { top, left, bottom, right, width, height }, in_viewport, occluded }
+    })
+}'''
+
+def parse(results):
+    return [Geometry(**result) for result in results]
+
+def selenium_geometry(driver, *elements):
+    "elements are selenium WebElements"
+    return parse(driver.execute_script(f'return ({GEOMETRY_FUNCTION})(arguments[0])', list(elements)))
+
+def playwright_geometry(page, *element_handles):
+    return parse(page.evaluate(GEOMETRY_FUNCTION, list(element_handles)))
+
+def capybara_geometry(page, *elements):
+    return selenium_geometry(page.driver.browser, *[element.native for element in elements])
+
+def selene_geometry(browser, *elements):
+    return selenium_geometry(browser.config.driver, *[element() for element in elements])
+
+def splinter_geometry(browser, *elements):
+    return selenium_geometry(browser.driver, *[element._element for element in elements])
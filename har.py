@@ -0,0 +1,141 @@
+# Reading har recordings without json.load()-ing them
+#
+# Long scenarios record hars of hundreds of megabytes, mostly response bodies and headers nobody looks at.
+# `read()` streams the file entry by entry (see file_formats.JsonStream) and keeps only a small record per request,
+# indexed by url, path, method and status. On top of that: waterfall statistics per page and timing budgets.
+#
+#   recording = har.read(tmp_path / 'recorded.har')
+#   recording.find(path='/selector_playground', method='GET')
+#   har.assert_no_request_slower_than(recording, 200, path='/selector_playground')
+
+from collections import namedtuple
+from datetime import datetime
+from urllib.parse import urlsplit
+
+from file_formats import InvalidFile, JsonStream
+
+Request = namedtuple('Request', [
+    'url', 'path', 'method', 'status', 'pageref', 'started', 'time',
+    'blocked', 'dns', 'connect', 'ssl', 'send', 'wait', 'receive', 'bytes',
+])
+Page = namedtuple('Page', ['id', 'title', 'started', 'on_content_load', 'on_load'])
+Waterfall = namedtuple('Waterfall', ['requests', 'dns', 'connect', 'wait', 'receive', 'bytes', 'total'])
+
+def phase_time(timings, name):
+    "-1 means 'does not apply', e.g. no dns lookup for a reused connection"
+    return max(timings.get(name, -1) or 0, 0)
+
+def transferred_bytes(response):
+    headers = max(response.get('headersSize', -1), 0)
+    body = response.get('bodySize', -1)
+    if body < 0:
+        body = response.get('content', {}).get('size', 0)
+    return headers + max(body, 0)
+
+def request_from(entry):
+    request, response, timings = entry['request'], entry['response'], entry.get('timings', {})
+    return Request(
+        url=request['url'],
+        path=urlsplit(request['url']).path,
+        method=request['method'],
+        status=response['status'],
+        pageref=entry.get('pageref'),
+        started=entry['startedDateTime'],
+        time=entry['time'],
+        bytes=transferred_bytes(response),
+        **{name: phase_time(timings, name) for name in ('blocked', 'dns', 'connect', 'ssl', 'send', 'wait', 'receive')},
+    )
+
+def page_from(page):
+    timings = page.get('pageTimings', {})
+    return Page(
+        id=page['id'],
+        title=page.get('title'),
+        started=page.get('startedDateTime'),
+        on_content_load=timings.get('onContentLoad', -1),
+        on_load=timings.get('onLoad', -1),
+    )
+
+class Har:
+
+    def __init__(self):
+        self.pages = {}
+        self.requests = []
+        self.by_url = {}
+        self.by_path = {}
+        self.by_method = {}
+        self.by_status = {}
+    
+    def add(self, request):
+        self.requests.append(request)
+        self.by_url.setdefault(request.url, []).append(request)
+        self.by_path.setdefault(request.path, []).append(request)
+        self.by_method.setdefault(request.method, []).append(request)
+        self.by_status.setdefault(request.status, []).append(request)
+    
+    def find(self, url=None, path=None, method=None, status=None):
+        "all requests matching every given criterion, in recording order"
+        candidates = self.requests
+        # start from the most selective index
+        if url is not None:
+            candidates = self.by_url.get(url, [])
+        elif path is not None:
+            candidates = self.by_path.get(path, [])
+        return [
+            request for request in candidates
+            if (url is None or url == request.url)
+            and (path is None or path == request.path)
+            and (method is None or method == request.method)
+            and (status is None or status == request.status)
+        ]
+    
+    def waterfall(self, pageref):
+        "summed up phases of all requests of a page, total is the wall clock time of its waterfall"
+        requests = [request for request in self.requests if pageref == request.pageref]
+        total = 0
+        if requests:
+            # python < 3.11 doesn't parse the Z suffix
+            starts = [datetime.fromisoformat(request.started.replace('Z', '+00:00')) for request in requests]
+            first = min(starts)
+            total = max((start - first).total_seconds() * 1000 + request.time for start, request in zip(starts, requests))
+        return Waterfall(
+            requests=len(requests),
+            dns=sum(request.dns for request in requests),
+            connect=sum(request.connect for request in requests),
+            wait=sum(request.wait for request in requests),
+            receive=sum(request.receive for request in requests),
+            bytes=sum(request.bytes for request in requests),
+            total=total,
+        )
+
+def read(path):
+    "stream the har at path into a Har, keeping only what Request and Page need"
+    recording = Har()
+    with open(path, encoding='utf-8') as file:
+        stream = JsonStream(file)
+        try:
+            for key in stream.members():
+                if 'log' != key:
+                    stream.value()
+                    continue
+                for key in stream.members():
+                    if 'pages' == key:
+                        for page in stream.items():
+                            page = page_from(page)
+                            recording.pages[page.id] = page
+                    elif 'entries' == key:
+                        for entry in stream.items():
+                            recording.add(request_from(entry))
+                    else:
+                        stream.value()
+        except (KeyError, TypeError, AttributeError) as error:
+            raise InvalidFile(f'{path}: unexpected har structure ({error!r})') from error
+    return recording
+
+def assert_no_request_slower_than(recording, milliseconds, **criteria):
+    "e.g. `assert_no_request_slower_than(recording, 200, path='/selector_playground')`"
+    requests = recording.find(**criteria)
+    assert requests, f'no requests matching {criteria} recorded'
+    too_slow = [request for request in requests if request.time > milliseconds]
+    assert not too_slow, f'slower than {milliseconds}ms: ' + ', '.join(
+        f'{request.method} {request.url} {request.time:.0f}ms' for request in too_slow)
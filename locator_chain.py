@@ -0,0 +1,116 @@
+# Nested searches in one round trip
+#
+# `find_element(...).find_element(...)` costs a command per step, and the dom can change between them.
+# `compile()` turns a chain of steps into one script that resolves the whole chain in the page at once,
+# returning either the element or the index of the step that found nothing.
+#
+#   chain = compile((By.ID, 'outer'), (By.XPATH, './/*[@id="inner"]'), (TEXT, 'fnord'))
+#   chain.find(driver)  # raises StepNotFound(NoSuchElementException), which names the failed step
+#
+# Steps are selenium locators, plus TEXT for the first element that contains a text.
+
+import functools
+import json
+
+from selenium.common.exceptions import NoSuchElementException
+
+TEXT = 'text'
+
+# (steps, scope) => { element, failed }
+RESOLVE = '''(steps, scope) => {
+    const find = (scope, [by, value]) => {
+        const xpath = expression => document.evaluate(
+            expression, scope, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue
+        switch (by) {
+            case 'xpath': return xpath(value)
+            case 'css selector': return scope.querySelector(value)
+            case 'id': return scope.querySelector('#' + CSS.escape(value))
+            case 'class name': return scope.querySelector('.' + CSS.escape(value))
+            case 'name': return scope.querySelector(`[name="${CSS.escape(value)}"]`)
+            case 'tag name': return scope.querySelector(value)
+            case 'link text': return xpath(`.//a[normalize-space() = ${JSON.stringify(value)}]`)
+            case 'partial link text': return xpath(`.//a[contains(., ${JSON.stringify(value)})]`)
+            case 'text': return xpath(`.//*[contains(text(), ${JSON.stringify(value)})]`)
+        }
+        throw new Error('unsupported locator strategy ' + by)
+    }
+    let current = scope || document
+    for (let index = 0; index < steps.length; index++) {
+        current = find(current, steps[index])
+        if ( ! current) {
+            return { element: null, failed: index }
+        }
+    }
+    return { element: current, failed: null }
+}'''
+
+class StepNotFound(NoSuchElementException):
+    "a NoSuchElementException, so WebDriverWait and friends keep retrying"
+    
+    def __init__(self, chain, failed):
+        self.chain = chain
+        self.failed = failed
+        found = f'inside {describe(chain.steps[failed - 1])}' if failed > 0 else 'in the document'
+        super().__init__(f'step {failed + 1} of {len(chain.steps)}: {describe(chain.steps[failed])} found nothing {found}')
+
+def describe(step):
+    by, value = step
+    return f'{by} {value!r}'
+
+class Chain:
+
+    def __init__(self, steps):
+        self.steps = steps
+        # steps are baked into the script, so every call only ships the scope
+        self.script = f'return ({RESOLVE})({json.dumps(steps)}, arguments[0])'
+    
+    def __repr__(self):
+        return ' > '.join(describe(step) for step in self.steps)
+    
+    def resolve(self, driver, scope=None):
+        "raw result, dict with element and failed"
+        return driver.execute_script(self.script, scope)
+    
+    def find(self, driver_or_element):
+        if hasattr(driver_or_element, 'execute_script'):
+            driver, scope = driver_or_element, None
+        else:
+            driver, scope = driver_or_element.parent, driver_or_element
+        result = self.resolve(driver, scope)
+        if result['failed'] is not None:
+            raise StepNotFound(self, result['failed'])
+        return result['element']
+
+@functools.lru_cache(maxsize=None)
+def compile_steps(steps):
+    return Chain(steps)
+
+def compile(*steps):
+    "steps are (strategy, value) tuples like (By.CSS_SELECTOR, '#outer') or (TEXT, 'fnord')"
+    return compile_steps(tuple(tuple(step) for step in steps))
+
+## Adapters
+
+def selene_element(browser, *steps):
+    "a lazy selene element, every retry of should() & co resolves the whole chain in one round trip"
+    from selene.core.entity import Element
+    from selene.core.locator import Locator
+    
+    chain = compile(*steps)
+    return Element(Locator(f'{browser}.chain({chain})', lambda: chain.find(browser.config.driver)), browser.config)
+
+def splinter_find(browser, *steps):
+    "like splinter's find_by_*(), waits up to browser.wait_time and returns an empty ElementList if nothing is found"
+    from selenium.common.exceptions import TimeoutException
+    from splinter.driver.webdriver import WebDriverElement
+    from splinter.element_list import ElementList
+    
+    # dom_wait builds on this module
+    import dom_wait
+    
+    query = repr(compile(*steps))
+    try:
+        element = dom_wait.wait_for(browser.driver, dom_wait.located(*steps), browser.wait_time).value
+    except TimeoutException:
+        return ElementList([], find_by='chain', query=query)
+    return ElementList([WebDriverElement(element, browser)], find_by='chain', query=query)
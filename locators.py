@@ -0,0 +1,69 @@
+# High level locators, built once per distinct query
+#
+# Selenium, selene and splinter only know css and xpath. Finding by label, placeholder, aria-label, title or value
+# means building a selector string, which long data driven tests do thousands of times for the same handful of queries.
+# Everything here is memoized, and returns a selenium style (by, selector) tuple, usable as
+#
+#   driver.find_element(*by_label('First name'))           # selenium
+#   browser.element(by_label('First name'))                # selene
+#   browser.find_by_xpath(by_label('First name').selector)  # splinter
+
+import functools
+from collections import namedtuple
+
+from selenium.webdriver.common.by import By
+
+Locator = namedtuple('Locator', ['by', 'selector'])
+
+CACHE_SIZE = 1024
+
+def xpath_literal(text):
+    "xpath 1.0 has no escapes, strings containing both quote characters need concat()"
+    if '"' not in text:
+        return f'"{text}"'
+    if "'" not in text:
+        return f"'{text}'"
+    return 'concat(' + ', \'"\', '.join(f'"{part}"' for part in text.split('"')) + ')'
+
+def css_string(text):
+    return '"' + text.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def by_label(text):
+    "input referenced by or nested in a label containing text"
+    label = f'//label[contains(string(.), {xpath_literal(text)})]'
+    return Locator(By.XPATH, f'//input[@id = {label}/@for] | {label}//input')
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def by_attributes(**attributes):
+    "exact attribute matches, all of them, e.g. by_attributes(placeholder='…', name='…')"
+    return Locator(By.CSS_SELECTOR, ''.join(
+        f'[{name.replace("_", "-")}={css_string(value)}]' for name, value in sorted(attributes.items())))
+
+def by_placeholder(text):
+    return by_attributes(placeholder=text)
+
+def by_aria_label(text):
+    return by_attributes(aria_label=text)
+
+def by_title(text):
+    return by_attributes(title=text)
+
+def by_value(text):
+    return by_attributes(value=text)
+
+## xpath.py
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def render_xpath(name, *args, **kwargs):
+    "renders expressions of xpath.html (the selector library of capybara), e.g. render_xpath('field', 'input_label')"
+    from xpath import html
+    from xpath.renderer import to_xpath
+    
+    return to_xpath(getattr(html, name)(*args, **kwargs))
+
+class XPathLibrary:
+    "`xpath.field('input_label')` instead of render_xpath('field', 'input_label')"
+    
+    def __getattr__(self, name):
+        return functools.partial(render_xpath, name)
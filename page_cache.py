@@ -0,0 +1,89 @@
+# Pages that never change are rendered once
+#
+#   @app.get('/form')
+#   @static_page
+#   def form(): …
+#
+# The first request renders the page and precomputes its gzip (and brotli, if installed) variant,
+# each with a strong ETag. After that a request is a dictionary lookup, or a bodyless 304 if the browser
+# already has the variant it would get. `Cache-Control: no-cache` makes browsers revalidate every time,
+# so a changed page shows up after a restart of the server.
+
+import functools
+import gzip
+import hashlib
+import threading
+
+import flask
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+def compressors():
+    "encodings in order of preference"
+    yield 'br', (lambda body: brotli.compress(body, quality=11)) if brotli is not None else None
+    yield 'gzip', lambda body: gzip.compress(body, compresslevel=9, mtime=0)
+
+def render(view, args, kwargs):
+    "the page and its compressed variants, by encoding"
+    response = flask.make_response(view(*args, **kwargs))
+    body = response.get_data()
+    digest = hashlib.sha256(body).hexdigest()[:32]
+    variants = {'identity': dict(body=body, etag=f'"{digest}"', content_type=response.content_type)}
+    for encoding, compress in compressors():
+        if compress is not None:
+            variants[encoding] = dict(body=compress(body), etag=f'"{digest}-{encoding}"', content_type=response.content_type)
+    return variants
+
+def accepted_encodings(header):
+    "Accept-Encoding without the ones explicitly refused via q=0"
+    accepted = set()
+    for part in header.replace(' ', '').split(','):
+        encoding, _, quality = part.partition(';q=')
+        try:
+            if quality and 0 == float(quality):
+                continue
+        except ValueError:
+            pass
+        accepted.add(encoding.lower())
+    return accepted
+
+def negotiate(variants, header):
+    accepted = accepted_encodings(header)
+    for encoding, _ in compressors():
+        if encoding in variants and (encoding in accepted or '*' in accepted):
+            return encoding
+    return 'identity'
+
+def matches(if_none_match, etag):
+    # If-None-Match uses the weak comparison, W/ prefixes don't matter
+    candidates = [candidate.strip().removeprefix('W/') for candidate in if_none_match.split(',')]
+    return '*' in candidates or etag in candidates
+
+def static_page(view):
+    "cache the response of a view that doesn't depend on the request, see module comment"
+    cache = {}
+    lock = threading.Lock()
+    
+    @functools.wraps(view)
+    def cached(*args, **kwargs):
+        key = (args, tuple(sorted(kwargs.items())))
+        if key not in cache:
+            with lock:
+                if key not in cache:
+                    cache[key] = render(view, args, kwargs)
+        variants = cache[key]
+        
+        encoding = negotiate(variants, flask.request.headers.get('Accept-Encoding', ''))
+        variant = variants[encoding]
+        headers = {'ETag': variant['etag'], 'Vary': 'Accept-Encoding', 'Cache-Control': 'no-cache'}
+        if 'identity' != encoding:
+            headers['Content-Encoding'] = encoding
+        
+        if matches(flask.request.headers.get('If-None-Match', ''), variant['etag']):
+            return flask.Response(status=304, headers=headers)
+        return flask.Response(variant['body'], content_type=variant['content_type'], headers=headers)
+    
+    return cached
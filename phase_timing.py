@@ -0,0 +1,117 @@
+# Where do the seconds go?
+#
+#   pytest --phase-timing
+#
+# Times setup and teardown of every fixture separately from the test call, plus explicitly marked phases
+# like driver resolution or the lazy browser launch in capybara's register_driver callbacks (see `timed()`).
+# Everything is attributed to framework and browser vendor of the test that triggered it and summed up
+# per session. Without the option no hooks are registered and `timed()` is a shared no-op context manager.
+
+import time
+from contextlib import contextmanager, nullcontext
+
+import pytest
+
+import session_report
+from benchmark import browser_of, framework_of
+
+# fixtures whose setup and teardown belong to a phase that is interesting on its own
+FIXTURE_PHASES = {
+    'flask_uri': 'server start',
+    'run_selenium_firefox_in_docker_if_neccessary': 'docker services',
+    'run_selenium_chrome_in_docker_if_neccessary': 'docker services',
+    'run_playwright_chrome_in_docker_if_neccessary': 'docker services',
+    'driver_pool': 'browser launch',
+    'browser': 'browser launch',
+    'browser2': 'browser launch',
+    'context': 'browser context',
+    'page': 'browser context',
+}
+
+NOT_TIMED = nullcontext()
+
+plugin = None
+
+def pytest_addoption(parser):
+    parser.addoption('--phase-timing', default=False, action='store_true',
+        help='time setup and teardown of fixtures separately from the tests and summarize where the time goes')
+
+def pytest_configure(config):
+    global plugin
+    if config.getoption('phase_timing'):
+        plugin = PhaseTiming(config)
+        config.pluginmanager.register(plugin, 'phase-timing')
+
+def timed(phase):
+    "time a phase that is not a fixture of its own, e.g. `with timed('driver resolution'): …`"
+    if plugin is None:
+        return NOT_TIMED
+    return plugin.timed(phase)
+
+class PhaseTiming:
+
+    def __init__(self, config):
+        self.config = config
+        self.item = None
+        self.teardown_started = {}
+    
+    def record(self, phase, stage, seconds, fixture=None):
+        session_report.record(self.config, 'phase_timing',
+            phase=phase, stage=stage, fixture=fixture, seconds=seconds,
+            framework=framework_of(self.item) if self.item is not None else None,
+            browser=browser_of(self.item) if self.item is not None else None,
+        )
+    
+    @contextmanager
+    def timed(self, phase):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(phase, 'explicit', time.perf_counter() - start)
+    
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_protocol(self, item):
+        self.item = item
+        yield
+        self.item = None
+    
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_call(self, item):
+        start = time.perf_counter()
+        yield
+        self.record('test body', 'call', time.perf_counter() - start)
+    
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_fixture_setup(self, fixturedef, request):
+        start = time.perf_counter()
+        yield
+        name = fixturedef.argname
+        self.record(FIXTURE_PHASES.get(name, 'other fixtures'), 'setup', time.perf_counter() - start, fixture=name)
+        
+        # finalizers run last in, first out, so this one runs right before the teardown of the fixture itself
+        def start_teardown():
+            self.teardown_started[id(fixturedef)] = time.perf_counter()
+        fixturedef.addfinalizer(start_teardown)
+    
+    def pytest_fixture_post_finalizer(self, fixturedef, request):
+        start = self.teardown_started.pop(id(fixturedef), None)
+        if start is None:
+            return
+        name = fixturedef.argname
+        self.record(FIXTURE_PHASES.get(name, 'other fixtures'), 'teardown', time.perf_counter() - start, fixture=name)
+    
+    def pytest_terminal_summary(self, terminalreporter, config):
+        totals = {}
+        for entry in session_report.sections(config).get('phase_timing', []):
+            key = (entry['phase'], entry['stage'], entry['framework'] or '', entry['browser'] or '')
+            count, seconds = totals.get(key, (0, 0))
+            totals[key] = (count + 1, seconds + entry['seconds'])
+        if not totals:
+            return
+        
+        terminalreporter.write_sep('=', 'where the time goes')
+        rows = sorted(totals.items(), key=lambda each: each[1][1], reverse=True)
+        for (phase, stage, framework, browser), (count, seconds) in rows:
+            terminalreporter.write_line(
+                f'{seconds:9.3f}s {count:5d}x  {phase} ({stage})  {framework} {browser}'.rstrip())
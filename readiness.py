@@ -0,0 +1,116 @@
+# Waiting for the services the tests need (flask, selenium grid, playwright server)
+#
+# All of them are probed with the same loop: exponential backoff from 10ms up to 1s between probes,
+# a hard timeout (`--service-timeout`) with an error that says what was last seen, and the time to ready
+# of every service ends up in the session report.
+
+import json
+import re
+import threading
+import time
+import urllib.request
+from collections import deque
+
+import pytest
+
+import session_report
+
+# services started in this process, shipped to the session report at the end
+startup_times = []
+
+class ServiceNotReady(TimeoutError):
+    pass
+
+def pytest_addoption(parser):
+    parser.addoption('--service-timeout', default=120, type=float,
+        help='seconds to wait for flask, selenium grid or the playwright server to come up. default: 120')
+
+def wait_until_ready(name, probe, timeout, process=None, details=None, initial_delay=.01, max_delay=1, backoff=2):
+    """
+    Call `probe()` until it returns something truthy, which is then returned.
+    
+    `process` fails the wait early if the process providing the service dies,
+    `details()` adds context (e.g. the last lines of output) to the error message.
+    """
+    start = time.perf_counter()
+    delay = initial_delay
+    last_error = None
+    while True:
+        try:
+            result = probe()
+        except (OSError, ValueError, KeyError) as error:
+            # connection refused, half started services returning garbage, …
+            result, last_error = None, error
+        
+        elapsed = time.perf_counter() - start
+        if result:
+            startup_times.append(dict(service=name, seconds=elapsed))
+            return result
+        
+        if process is not None and process.poll() is not None:
+            raise ServiceNotReady(message(name, f'exited with {process.returncode} after {elapsed:.1f}s', last_error, details))
+        if elapsed >= timeout:
+            raise ServiceNotReady(message(name, f'not ready after {timeout}s', last_error, details))
+        
+        time.sleep(min(delay, timeout - elapsed))
+        delay = min(delay * backoff, max_delay)
+
+def message(name, problem, last_error, details):
+    lines = [f'{name} {problem}']
+    if last_error is not None:
+        lines.append(f'last error: {last_error!r}')
+    if details is not None:
+        lines.append(details())
+    return '\n'.join(lines)
+
+## Probes
+
+def http_ok(url):
+    with urllib.request.urlopen(url, timeout=1) as response:
+        return 200 == response.status
+
+def selenium_grid_ready(grid_url):
+    with urllib.request.urlopen(grid_url + '/wd/hub/status', timeout=1) as response:
+        return json.load(response)['value']['ready']
+
+class OutputWatcher:
+    """
+    Reads the output of a process in a background thread, so probing for a line never blocks.
+    Keeps the last lines around for error messages.
+    """
+    
+    def __init__(self, stream, pattern, keep_lines=20):
+        self.pattern = re.compile(pattern)
+        self.lines = deque(maxlen=keep_lines)
+        self.found = None
+        self.thread = threading.Thread(target=self.read, args=(stream,), daemon=True)
+        self.thread.start()
+    
+    def read(self, stream):
+        for line in stream:
+            self.lines.append(line.rstrip())
+            if self.found is None:
+                self.found = self.pattern.search(line)
+    
+    def match(self):
+        return self.found
+    
+    def tail(self):
+        return 'last output:\n' + '\n'.join(self.lines)
+
+## Reporting
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_sessionfinish(session):
+    # before session_report ships the sections of a worker to the controller
+    for startup_time in startup_times:
+        session_report.record(session.config, 'service_startup', **startup_time)
+
+def pytest_terminal_summary(terminalreporter, config):
+    services = session_report.sections(config).get('service_startup', [])
+    if not services:
+        return
+    
+    terminalreporter.write_sep('=', 'service startup')
+    for service in services:
+        terminalreporter.write_line(f"{service['service']} ({service['worker']}): ready after {service['seconds']:.3f}s")
@@ -0,0 +1,101 @@
+# Video, har and trace of playwright tests, only when they are worth looking at
+#
+#   pytest --recording retain-on-failure
+#
+#   @pytest.mark.recording('on')
+#   def test_something(page): …
+#
+# off: nothing is recorded (default)
+# on: every test keeps its recording
+# retain-on-failure: every test records, only failed ones keep it
+# on-first-retry: only the first rerun of a failed test records (needs pytest-rerunfailures, otherwise nothing is)
+#
+# Recordings go into a scratch dir in the tmp_path of the test. Kept ones are renamed to `recording/` next to it
+# and noted as a 'recording' user property, the others are deleted and the trace is never even written.
+# Video encoding still runs while recording, so `off` stays the fastest.
+
+import os
+import shutil
+
+import pytest
+
+OFF = 'off'
+ON = 'on'
+RETAIN_ON_FAILURE = 'retain-on-failure'
+ON_FIRST_RETRY = 'on-first-retry'
+POLICIES = (OFF, ON, RETAIN_ON_FAILURE, ON_FIRST_RETRY)
+
+def pytest_addoption(parser):
+    parser.addoption('--recording', default=OFF, choices=POLICIES,
+        help='video, har and trace of playwright tests, @pytest.mark.recording(policy) overrides it. default: off')
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_makereport(item, call):
+    # rep_setup, rep_call and rep_teardown, so fixtures can tell in their teardown whether the test failed
+    outcome = yield
+    report = outcome.get_result()
+    setattr(item, f'rep_{report.when}', report)
+
+def policy_of(item):
+    marker = item.get_closest_marker('recording')
+    policy = marker.args[0] if marker is not None else item.config.getoption('recording')
+    if policy not in POLICIES:
+        raise ValueError(f'unknown recording policy {policy!r}, expected one of {", ".join(POLICIES)}')
+    return policy
+
+def is_recording(policy, item):
+    if ON_FIRST_RETRY == policy:
+        # pytest-rerunfailures counts executions from 1
+        return 2 == getattr(item, 'execution_count', 1)
+    return policy in (ON, RETAIN_ON_FAILURE)
+
+def has_failed(item):
+    reports = [getattr(item, f'rep_{when}', None) for when in ('setup', 'call')]
+    return any(report is not None and report.failed for report in reports)
+
+def is_kept(policy, item):
+    if RETAIN_ON_FAILURE == policy:
+        return has_failed(item)
+    return policy in (ON, ON_FIRST_RETRY)
+
+class Recorder:
+    "records a browser context into scratch, see module comment"
+    
+    def __init__(self, scratch):
+        self.scratch = scratch
+        self.video_dir = scratch / 'videos'
+        self.har_path = scratch / 'recorded.har'
+        self.trace_path = scratch / 'trace.zip'
+    
+    def context_options(self):
+        "for browser.new_context()"
+        return dict(record_video_dir=self.video_dir, record_har_path=self.har_path)
+    
+    def start(self, context):
+        context.tracing.start(screenshots=True, snapshots=True)
+    
+    def finish(self, context, keep, destination):
+        """
+        Closes the context, returns destination if the recording was kept, else None.
+        Tests may have closed the context themselves, video and har are written then, only the trace is lost.
+        """
+        from playwright.sync_api import Error
+        
+        try:
+            try:
+                # without a path the trace is dropped inside the browser, nothing is zipped or transferred
+                context.tracing.stop(path=self.trace_path if keep else None)
+            except Error:
+                pass
+            # writes video and har, a no-op for a closed context
+            context.close()
+        except BaseException:
+            shutil.rmtree(self.scratch, ignore_errors=True)
+            raise
+        
+        if not keep or not self.scratch.exists():
+            shutil.rmtree(self.scratch, ignore_errors=True)
+            return None
+        shutil.rmtree(destination, ignore_errors=True)
+        os.replace(self.scratch, destination)
+        return destination
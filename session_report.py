@@ -0,0 +1,82 @@
+# Session report: one json document for the whole run, even when it is spread over many xdist workers
+#
+#   pytest -n auto --session-report report.json
+#
+# Contains every test result with the worker it ran on, plus sections that other plugins contribute via
+# `record()`. Workers ship their sections to the controller when they shut down, where everything is merged.
+
+import json
+
+import pytest
+
+from workers import worker_id
+
+PLUGIN_NAME = 'session-report'
+
+def pytest_addoption(parser):
+    parser.addoption('--session-report', default=None, metavar='PATH', help='write a json report of the whole session to PATH')
+
+def pytest_configure(config):
+    config.pluginmanager.register(SessionReport(), PLUGIN_NAME)
+
+def record(config, section, **entry):
+    "add an entry to a section of the report, from any process"
+    config.pluginmanager.get_plugin(PLUGIN_NAME).record(section, worker=worker_id(), **entry)
+
+def sections(config):
+    return config.pluginmanager.get_plugin(PLUGIN_NAME).sections
+
+class SessionReport:
+
+    def __init__(self):
+        self.sections = {}
+    
+    def record(self, section, **entry):
+        self.sections.setdefault(section, []).append(entry)
+    
+    def merge(self, sections):
+        for section, entries in sections.items():
+            self.sections.setdefault(section, []).extend(entries)
+    
+    def pytest_runtest_logreport(self, report):
+        # on the controller the reports of the workers arrive here as well
+        if 'call' != report.when and not (report.failed or report.skipped):
+            return
+        node = getattr(report, 'node', None)
+        self.record('tests',
+            nodeid=report.nodeid,
+            when=report.when,
+            outcome=report.outcome,
+            duration=report.duration,
+            worker=node.gateway.id if node is not None else worker_id(),
+        )
+    
+    def pytest_sessionfinish(self, session):
+        config = session.config
+        if hasattr(config, 'workeroutput'):
+            # test results are already known to the controller, only ship what the other plugins recorded
+            sections = {name: entries for name, entries in self.sections.items() if 'tests' != name}
+            config.workeroutput[PLUGIN_NAME] = json.dumps(sections)
+            return
+        
+        path = config.getoption('session_report')
+        if path is not None:
+            with open(path, 'w') as file:
+                json.dump(self.sections, file, indent=2)
+    
+    def pytest_terminal_summary(self, terminalreporter):
+        workers = {}
+        for test in self.sections.get('tests', []):
+            count, seconds = workers.get(test['worker'], (0, 0))
+            workers[test['worker']] = (count + 1, seconds + test['duration'])
+        if len(workers) < 2:
+            return
+        
+        terminalreporter.write_sep('=', 'tests per worker')
+        for worker, (count, seconds) in sorted(workers.items()):
+            terminalreporter.write_line(f'{worker}: {count} tests, {seconds:.2f}s')
+    
+    # only called if pytest-xdist is installed
+    @pytest.hookimpl(optionalhook=True)
+    def pytest_testnodedown(self, node, error):
+        self.merge(json.loads(node.workeroutput.get(PLUGIN_NAME, '{}')))
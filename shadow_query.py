@@ -0,0 +1,104 @@
+# Searching through shadow doms in one go
+#
+# With plain selenium every web component on the way needs its own `.shadow_root` and `find_element()`,
+# a round trip per hop. This walks the document and every open shadow root below it in a single script,
+# like playwright's css engine does. Closed shadow roots stay closed.
+#
+#   find(driver, 'input[name="first"]')
+#   find(driver, 'First Name', by=LABEL)  # the input labeled that
+#   find_all(driver, 'Name', by=TEXT)
+#
+# Roots are searched breadth first, light dom before the shadow doms inside it.
+# Nothing waits here, the page has to be ready.
+
+from selenium.common.exceptions import NoSuchElementException
+
+CSS = 'css'
+TEXT = 'text'
+LABEL = 'label'
+
+# (query, by, scope, all) => element, null or list of elements
+DEEP_QUERY = '''(query, by, scope, all) => {
+    const contains = text => text.replace(/\\s+/g, ' ').includes(query)
+    const matchers = {
+        css: root => root.querySelectorAll(query),
+        text: root => {
+            const found = new Set()
+            const walker = document.createTreeWalker(root, NodeFilter.SHOW_TEXT)
+            while (walker.nextNode()) {
+                if (contains(walker.currentNode.data)) {
+                    found.add(walker.currentNode.parentElement)
+                }
+            }
+            return found
+        },
+        label: root => [
+            ...Array.from(root.querySelectorAll('label'))
+                .filter(label => contains(label.textContent)).map(label => label.control),
+            ...Array.from(root.querySelectorAll('[aria-label]'))
+                .filter(element => contains(element.getAttribute('aria-label'))),
+        ].filter(Boolean),
+    }
+    const matcher = matchers[by]
+    if ( ! matcher) {
+        throw new Error('unsupported query type ' + by)
+    }
+    
+    const matches = []
+    const roots = [scope || document]
+    if (scope && scope.shadowRoot) {
+        roots.push(scope.shadowRoot)
+    }
+    // index instead of shift(), which would make hundreds of components quadratic
+    for (let index = 0; index < roots.length; index++) {
+        const root = roots[index]
+        for (const element of matcher(root)) {
+            if ( ! all) {
+                return element
+            }
+            matches.push(element)
+        }
+        for (const element of root.querySelectorAll('*')) {
+            if (element.shadowRoot) {
+                roots.push(element.shadowRoot)
+            }
+        }
+    }
+    return all ? matches : null
+}'''
+
+SCRIPT = f'return ({DEEP_QUERY})(...arguments)'
+
+def find_all(driver, query, by=CSS, scope=None):
+    "all matches below scope (a WebElement) or the whole document"
+    return driver.execute_script(SCRIPT, query, by, scope, True)
+
+def find(driver, query, by=CSS, scope=None):
+    element = driver.execute_script(SCRIPT, query, by, scope, False)
+    if element is None:
+        raise NoSuchElementException(f'no {by} {query!r} in the document or any open shadow root')
+    return element
+
+## Adapters
+
+def capybara_find(page, query, by=CSS):
+    "a capybara Element, without capybaras waiting and retrying"
+    element = page.evaluate_script(f'({DEEP_QUERY})(arguments[0], arguments[1], null, false)', query, by)
+    if element is None:
+        raise NoSuchElementException(f'no {by} {query!r} in the document or any open shadow root')
+    return element
+
+def selene_element(browser, query, by=CSS):
+    "a lazy selene element, retried by should() & co like any other"
+    from selene.core.entity import Element
+    from selene.core.locator import Locator
+    
+    return Element(Locator(f'{browser}.deep({by} {query!r})', lambda: find(browser.config.driver, query, by)), browser.config)
+
+def splinter_find(browser, query, by=CSS):
+    "ElementList like splinter's find_by_*(), empty if nothing is found"
+    from splinter.driver.webdriver import WebDriverElement
+    from splinter.element_list import ElementList
+    
+    elements = find_all(browser.driver, query, by)
+    return ElementList([WebDriverElement(element, browser) for element in elements], find_by='deep', query=query)
@@ -0,0 +1,40 @@
+# The budget check itself, no browser involved
+
+import pytest
+
+from budget import Budget
+
+def test_budget_is_checked_after_the_last_round():
+    with pytest.raises(AssertionError, match='over the budget'):
+        with Budget(seconds=0, repeat=2, warmup=1) as budget:
+            for sample in budget:
+                with sample:
+                    pass
+    assert 2 == len(budget.samples)
+
+def test_ending_the_loop_early_fails():
+    with pytest.raises(AssertionError, match='only 1 of 3 rounds ran'):
+        with Budget(seconds=10, repeat=3, warmup=0) as budget:
+            for sample in budget:
+                with sample:
+                    pass
+                break
+
+def test_exceptions_are_not_hidden_by_the_verdict():
+    with pytest.raises(KeyError):
+        with Budget(seconds=0, repeat=3) as budget:
+            for sample in budget:
+                with sample:
+                    raise KeyError('fnord')
+
+@pytest.mark.parametrize('repeat, warmup', [(0, 1), (-1, 0), (1, -1)])
+def test_nonsense_rounds_are_rejected(repeat, warmup):
+    with pytest.raises(ValueError):
+        Budget(seconds=1, repeat=repeat, warmup=warmup)
+
+def test_samples_are_recorded_on_the_node(performance_budget, request):
+    with performance_budget(seconds=10, operation='nothing', repeat=3, warmup=1) as budget:
+        for sample in budget:
+            with sample:
+                pass
+    assert 3 == len([value for key, value in request.node.user_properties if 'timing' == key])
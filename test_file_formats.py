@@ -0,0 +1,72 @@
+# The artifact readers on their own, no browser involved
+#
+# Everything in with_*.py is parametrized by browser vendor, these run once.
+
+import json
+import struct
+import zlib
+
+import pytest
+
+import file_formats
+import har
+
+def har_with_body(path, body_size):
+    "a har like playwright writes it, with one response body of body_size bytes embedded"
+    def entry(url, text):
+        return dict(
+            pageref='page@1', startedDateTime='2022-01-01T00:00:00.000Z', time=5,
+            request=dict(method='GET', url=url, headers=[]),
+            response=dict(status=200, headers=[], content=dict(size=len(text), mimeType='text/html', text=text)),
+            timings=dict(blocked=-1, dns=-1, connect=-1, send=0, wait=4, receive=1),
+        )
+    path.write_text(json.dumps(dict(log=dict(
+        version='1.2', creator=dict(name='Playwright'),
+        pages=[dict(id='page@1', startedDateTime='2022-01-01T00:00:00.000Z', title='', pageTimings={})],
+        entries=[entry('http://localhost/big', 'x' * body_size), entry('http://localhost/small', 'fnord')],
+    ))))
+    return path
+
+def test_reading_har_with_big_response_body(tmp_path, performance_budget):
+    """
+    - playwright embeds response bodies in the har, one big download makes for one huge entry
+    - the streaming reader must not get slow on a single big value
+    """
+    path = har_with_body(tmp_path / 'big.har', 20 * 1024 * 1024)
+    # json.load() takes well under .1 seconds for this
+    with performance_budget(seconds=2, operation='har_info of 20MB entry', repeat=1, warmup=0) as budget:
+        for sample in budget:
+            with sample:
+                assert 2 == file_formats.har_info(path).entries
+    with performance_budget(seconds=2, operation='har.read of 20MB entry', repeat=1, warmup=0) as budget:
+        for sample in budget:
+            with sample:
+                recorded = har.read(path)
+    assert ['/big', '/small'] == [request.path for request in recorded.requests]
+    assert 20 * 1024 * 1024 == recorded.find(path='/big')[0].bytes
+
+def png(width=3, height=2):
+    "the smallest png there is: signature, IHDR, one IDAT and IEND"
+    def chunk(chunk_type, data):
+        return struct.pack('>I', len(data)) + chunk_type + data + struct.pack('>I', zlib.crc32(chunk_type + data))
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    pixels = zlib.compress(b''.join(b'\x00' + b'\xff' * 3 * width for _ in range(height)))
+    return file_formats.PNG_SIGNATURE + chunk(b'IHDR', header) + chunk(b'IDAT', pixels) + chunk(b'IEND', b'')
+
+def test_png_info(tmp_path):
+    path = tmp_path / 'screenshot.png'
+    path.write_bytes(png(width=3, height=2))
+    assert file_formats.PngInfo(3, 2, 8, 'RGB', False) == file_formats.png_info(path)
+
+@pytest.mark.parametrize('size', [0, 8, 12, 20, 32])
+def test_truncated_png_is_invalid(tmp_path, size):
+    path = tmp_path / 'screenshot.png'
+    path.write_bytes(png()[:size])
+    with pytest.raises(file_formats.InvalidFile):
+        file_formats.png_info(path)
+
+def test_png_without_leading_ihdr_is_invalid(tmp_path):
+    path = tmp_path / 'screenshot.png'
+    path.write_bytes(png().replace(b'IHDR', b'IHDX'))
+    with pytest.raises(file_formats.InvalidFile, match='IHDR'):
+        file_formats.png_info(path)
@@ -0,0 +1,113 @@
+# Comparing screenshots against stored baselines
+#
+# Screenshots are decoded into numpy arrays and compared as a whole, a full-HD screenshot is two million pixels
+# which a python loop would take seconds for. Per pixel, the difference is the perceived color distance in YIQ
+# space (brightness weighs most, like pixelmatch and playwright's toHaveScreenshot do), after blending onto white.
+#
+#   difference = compare(driver.get_screenshot_as_png(), baseline_path, masks=[Mask(0, 0, 200, 50)])
+#   difference = compare(png, baseline_path, masks=[mask_around(selenium_geometry(driver, field)[0].rect)])
+#   difference.pixels, difference.ratio
+#   save_png(heatmap(difference), tmp_path / 'diff.png')
+#
+# threshold: how different a pixel may look before it counts, 0 (exact) to 1 (anything goes)
+# tolerance: the fraction of all pixels that may differ, to absorb e.g. anti aliasing noise
+# masks: regions that are ignored, e.g. a clock or a blinking cursor
+
+import io
+import math
+from collections import namedtuple
+from pathlib import Path
+
+import numpy
+from PIL import Image
+
+# largest possible delta, black against white
+MAX_DELTA = 35215
+
+Mask = namedtuple('Mask', ['x', 'y', 'width', 'height'])
+
+Difference = namedtuple('Difference', ['pixels', 'ratio', 'delta', 'actual', 'expected'])
+Difference.__doc__ = "delta is the per pixel color distance (0 to 1), zero in masked regions. None if sizes differ"
+
+def mask_around(rect, margin=0):
+    "Mask of an element rect as geometry.py reports it, rounded outwards, margin e.g. for focus rings"
+    left, top = math.floor(rect['left']) - margin, math.floor(rect['top']) - margin
+    return Mask(left, top, math.ceil(rect['right']) + margin - left, math.ceil(rect['bottom']) + margin - top)
+
+def decode(png):
+    "bytes, a path or an array into a height × width × 4 float array of RGBA values"
+    if isinstance(png, numpy.ndarray):
+        return png.astype(numpy.float32, copy=False)
+    source = io.BytesIO(png) if isinstance(png, (bytes, bytearray)) else Path(png)
+    with Image.open(source) as image:
+        return numpy.asarray(image.convert('RGBA'), dtype=numpy.float32)
+
+def encode(pixels):
+    "array of RGBA or RGB values into png bytes"
+    buffer = io.BytesIO()
+    Image.fromarray(numpy.clip(pixels, 0, 255).astype(numpy.uint8)).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+def save_png(pixels, path):
+    Path(path).write_bytes(encode(pixels))
+
+def blend_on_white(rgba):
+    alpha = rgba[..., 3:4] / 255
+    return 255 + (rgba[..., :3] - 255) * alpha
+
+def yiq(rgb):
+    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    return (
+        r * 0.29889531 + g * 0.58662247 + b * 0.11448223,
+        r * 0.59597799 - g * 0.27417610 - b * 0.32180189,
+        r * 0.21147017 - g * 0.52261711 + b * 0.31114694,
+    )
+
+def color_delta(actual, expected):
+    "perceived distance per pixel, 0 to 1"
+    (y1, i1, q1), (y2, i2, q2) = yiq(blend_on_white(actual)), yiq(blend_on_white(expected))
+    return (0.5053 * (y1 - y2) ** 2 + 0.299 * (i1 - i2) ** 2 + 0.1957 * (q1 - q2) ** 2) / MAX_DELTA
+
+def mask_array(shape, masks):
+    ignored = numpy.zeros(shape[:2], dtype=bool)
+    for mask in masks:
+        ignored[max(mask.y, 0):mask.y + mask.height, max(mask.x, 0):mask.x + mask.width] = True
+    return ignored
+
+def compare(actual, expected, threshold=.1, masks=()):
+    actual, expected = decode(actual), decode(expected)
+    if actual.shape != expected.shape:
+        total = max(actual.shape[0] * actual.shape[1], expected.shape[0] * expected.shape[1])
+        return Difference(total, 1.0, None, actual, expected)
+    
+    delta = color_delta(actual, expected)
+    delta[mask_array(delta.shape, masks)] = 0
+    # threshold is squared like in pixelmatch, so .1 means 'a tenth of the way from black to white'
+    pixels = int(numpy.count_nonzero(delta > threshold ** 2))
+    return Difference(pixels, pixels / delta.size, delta, actual, expected)
+
+def matches(difference, tolerance=0):
+    return difference.ratio <= tolerance
+
+def heatmap(difference, threshold=.1):
+    """
+    The expected image faded to gray, with pixels above the threshold in yellow (barely) to red (very different).
+    Sizes that differ show the actual image on red.
+    """
+    if difference.delta is None:
+        height = max(difference.actual.shape[0], difference.expected.shape[0])
+        width = max(difference.actual.shape[1], difference.expected.shape[1])
+        canvas = numpy.full((height, width, 3), (255, 0, 0), dtype=numpy.float32)
+        canvas[:difference.actual.shape[0], :difference.actual.shape[1]] = blend_on_white(difference.actual)
+        return canvas
+    
+    y, _, _ = yiq(blend_on_white(difference.expected))
+    faded = 255 - (255 - y) * .1
+    canvas = numpy.repeat(faded[..., numpy.newaxis], 3, axis=2)
+    
+    changed = difference.delta > threshold ** 2
+    intensity = numpy.sqrt(difference.delta[changed])
+    canvas[changed] = numpy.stack([
+        numpy.full_like(intensity, 255), 255 * (1 - intensity), numpy.zeros_like(intensity),
+    ], axis=-1)
+    return canvas
@@ -0,0 +1,78 @@
+# How long does a framework take to notice that the dom changed?
+#
+# /mutation_timing appends elements at known times and stamps each with the page clock.
+# The time the framework's wait returned is mapped onto the same clock, the difference is the detection latency:
+# half a poll interval on average for polling waits, about one round trip for waits that are pushed from the page.
+# Latencies are recorded per strategy via record_timing(), see `pytest --benchmark`.
+
+import time
+
+from benchmark import record_timing
+
+MUTATIONS = 5
+# each wait only starts when the previous one returned, up to one poll interval (500ms for WebDriverWait) late.
+# Mutations further apart than that are guaranteed to happen while their wait is already running
+DELAY = 1000
+JITTER = 300
+
+# high resolution and the same origin for every document of the browser
+PAGE_NOW = 'performance.timeOrigin + performance.now()'
+
+def path(delay=DELAY, jitter=JITTER, mutations=MUTATIONS):
+    return f'/mutation_timing?delay={delay}&jitter={jitter}&mutations={mutations}'
+
+class PageClock:
+    "maps time.perf_counter() onto the page clock, in milliseconds"
+    
+    def __init__(self, evaluate):
+        self.evaluate = evaluate
+        self.offset = None
+        self.uncertainty = None
+    
+    def sync(self, rounds=5):
+        # the round trip with the smallest delay gives the best estimate, assuming both directions take the same time
+        for round in range(rounds):
+            before = time.perf_counter() * 1000
+            page_time = self.evaluate(PAGE_NOW)
+            after = time.perf_counter() * 1000
+            if self.uncertainty is None or (after - before) / 2 < self.uncertainty:
+                self.offset = page_time - (before + after) / 2
+                self.uncertainty = (after - before) / 2
+    
+    def now(self):
+        return time.perf_counter() * 1000 + self.offset
+
+def measure(node, strategy, evaluate, wait_for_mutation, mutations=MUTATIONS):
+    """
+    With /mutation_timing loaded: start the mutations, wait for each with `wait_for_mutation(index)`,
+    return the latencies in seconds and record them as '<strategy> detection latency'.
+    `evaluate(expression)` returns the value of a javascript expression in the page.
+    """
+    clock = PageClock(evaluate)
+    clock.sync()
+    evaluate('start()')
+    
+    started, returned = [], []
+    for index in range(mutations):
+        started.append(clock.now())
+        wait_for_mutation(index)
+        returned.append(clock.now())
+    
+    mutation_times = evaluate('mutationTimes')
+    for index, (start, mutated) in enumerate(zip(started, mutation_times)):
+        # a mutation that was already there when its wait began would make the latency look better than it is
+        assert start < mutated, f'mutation {index} happened {start - mutated:.0f}ms before its wait started, increase the delay'
+    latencies = [(now - mutated) / 1000 for now, mutated in zip(returned, mutation_times)]
+    for latency in latencies:
+        record_timing(node, f'{strategy} detection latency', latency)
+    return latencies
+
+def record_in_page(node, strategy, detected, evaluate):
+    """
+    The part of the latency spent in the page: from each mutation to `detected` (page clock timestamps,
+    e.g. dom_wait's Waited.detected), recorded as '<strategy> in page detection latency'. The rest is the way back.
+    """
+    latencies = [(noticed - mutated) / 1000 for noticed, mutated in zip(detected, evaluate('mutationTimes'))]
+    for latency in latencies:
+        record_timing(node, f'{strategy} in page detection latency', latency)
+    return latencies
@@ -0,0 +1,127 @@
+# Pool of running webdrivers shared across a test session
+#
+# Starting a browser and its driver service is by far the most expensive part of a selenium test.
+# Instead of a new browser for every test, drivers are checked out of the pool and reset when they are returned.
+# Reset is brute force (close extra windows, clear cookies and storage, navigate away) so a driver is recycled
+# (quit and relaunched) after a number of uses, or as soon as it stops responding.
+# WebDriver can only clear cookies and storage of the page it shows. Chromium clears the other origins via CDP,
+# other browsers are recycled when a test leaves more than one origin open.
+
+from selenium.common.exceptions import InvalidCookieDomainException, NoAlertPresentException, WebDriverException
+
+class Slot:
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.uses = 0
+
+class WebDriverPool:
+
+    def __init__(self, factory, max_uses=20):
+        self.factory = factory
+        self.max_uses = max_uses
+        self.idle = []
+        self.checked_out = {}
+
+    def checkout(self):
+        while self.idle:
+            slot = self.idle.pop()
+            if is_healthy(slot.driver):
+                break
+            quit_quietly(slot.driver)
+        else:
+            slot = Slot(self.factory())
+
+        slot.uses += 1
+        self.checked_out[id(slot.driver)] = slot
+        return slot.driver
+
+    def checkin(self, driver):
+        slot = self.checked_out.pop(id(driver))
+        if slot.uses >= self.max_uses or not reset(driver):
+            quit_quietly(driver)
+            return
+        self.idle.append(slot)
+
+    def close(self):
+        for slot in self.idle + list(self.checked_out.values()):
+            quit_quietly(slot.driver)
+        self.idle.clear()
+        self.checked_out.clear()
+
+def is_healthy(driver):
+    try:
+        driver.window_handles
+        return True
+    except WebDriverException:
+        return False
+
+def quit_quietly(driver):
+    try:
+        driver.quit()
+    except WebDriverException:
+        # already crashed, nothing left to clean up
+        pass
+
+def accept_alert_if_present(driver):
+    try:
+        driver.switch_to.alert.accept()
+    except NoAlertPresentException:
+        pass
+
+def origin_of(driver):
+    "'null' for about:blank and friends, which have nothing to clear"
+    return driver.execute_script('return window.location.origin')
+
+def is_chromium(driver):
+    # only the local chrome and edge drivers talk CDP, a remote one doesn't
+    return hasattr(driver, 'execute_cdp_cmd')
+
+def clear_other_origins(driver, origins):
+    "chromium only: cookies of all origins at once, storage of every origin the windows showed"
+    driver.execute_cdp_cmd('Network.clearBrowserCookies', {})
+    for origin in origins:
+        driver.execute_cdp_cmd('Storage.clearDataForOrigin', dict(origin=origin, storageTypes='all'))
+
+def reset(driver):
+    """
+    Best effort reset of everything a test can leave behind. Returns False if the driver should be recycled instead.
+
+    - cookies and storage can only be cleared for the origin of the currently shown page,
+      chromium clears the origins of all windows (and every cookie) via CDP, other browsers showing more than
+      one origin are recycled. Origins only visited earlier in a window's history go unnoticed.
+    - beforeunload handlers are dealt with by accepting the dialog they open while navigating away
+    """
+    try:
+        origins = set()
+        first_window, *other_windows = driver.window_handles
+        for window in other_windows:
+            driver.switch_to.window(window)
+            accept_alert_if_present(driver)
+            origins.add(origin_of(driver))
+            driver.close()
+            accept_alert_if_present(driver)
+        driver.switch_to.window(first_window)
+        accept_alert_if_present(driver)
+        origins.add(origin_of(driver))
+        origins.discard('null')
+
+        try:
+            driver.delete_all_cookies()
+        except InvalidCookieDomainException:
+            # about:blank and friends don't have cookies
+            pass
+        driver.execute_script('''
+            try { window.localStorage.clear() } catch (e) {}
+            try { window.sessionStorage.clear() } catch (e) {}
+        ''')
+        if is_chromium(driver):
+            clear_other_origins(driver, origins)
+        elif len(origins) > 1:
+            # cookies and storage of the other origins are out of reach, only a new browser is clean
+            return False
+        driver.get('about:blank')
+        accept_alert_if_present(driver)
+        return True
+    except WebDriverException:
+        return False
@@ -1,42 +1,54 @@
 # https://github.com/elliterate/capybara.py
 # https://elliterate.github.io/capybara.py/
 
-import re, sys
+import re
 
 import capybara
 from capybara.dsl import page
 from capybara.selenium.driver import Driver
 from selenium import webdriver
-from selenium.common.exceptions import ElementClickInterceptedException, ElementNotInteractableException
+from selenium.common.exceptions import ElementClickInterceptedException, ElementNotInteractableException, NoSuchElementException
 from selenium.webdriver.common.alert import Alert
 from selenium.webdriver.firefox.service import Service as FirefoxService
 from selenium.webdriver.chrome.service import Service as ChromeService
-from webdriver_manager.chrome import ChromeDriverManager
-from webdriver_manager.firefox import GeckoDriverManager
 
-from conftest import assert_is_png, assert_no_slower_than, find_application, add_auth_to_uri
+from conftest import assert_is_png, add_auth_to_uri, selenium_grid_url
+from driver_resolver import resolve_driver
+from geometry import capybara_geometry
+from visual_diff import mask_around
+import shadow_query
+import wait_latency
+from benchmark import timing
+from phase_timing import timed
 import pytest
 
-def is_headless():
-    "cannot use the is_headless fixture here, as the init functions are outside the scope of pytest fixtures"
-    return '--headless' in sys.argv
+# the init functions are outside the scope of pytest fixtures, so configure_browser() sets these before any browser starts.
+# sys.argv doesn't work, pytest-xdist workers don't get the command line
+headless = False
+executable = None
+
+def launched(driver):
+    "capybara starts the browser lazily on first use, start it right away so its launch can be timed on its own"
+    with timed('browser launch'):
+        driver.browser
+    return driver
 
 @capybara.register_driver("selenium-firefox")
 def init_firefox(app):
     options = webdriver.FirefoxOptions()
-    options.binary_location = find_application('Firefox')
-    options.headless = is_headless()
+    options.binary_location = executable.path
+    options.headless = headless
     # otherwise marionette automatically disables beforeunload event handling
     # still requires interaction to trigger
     options.set_preference("dom.disable_beforeunload", False)
     
-    service = FirefoxService(GeckoDriverManager().install())
+    service = FirefoxService(resolve_driver('firefox', executable.version))
     
-    return Driver(app, browser="firefox", options=options, service=service,
+    return launched(Driver(app, browser="firefox", options=options, service=service,
         # cannot set these after the fact, so we set them here
         clear_local_storage=True,
         clear_session_storage=True,
-    )
+    ))
 
 @capybara.register_driver("selenium-chrome")
 def init_chrome(app):
@@ -46,16 +58,16 @@ def init_chrome(app):
     - a bit faster
     """
     options = webdriver.ChromeOptions()
-    options.binary_location = find_application('Google Chrome')
-    options.headless = is_headless()
+    options.binary_location = executable.path
+    options.headless = headless
     
-    service = ChromeService(ChromeDriverManager().install())
+    service = ChromeService(resolve_driver('chrome', executable.version))
     
-    return Driver(app, browser="chrome", options=options, service=service,
+    return launched(Driver(app, browser="chrome", options=options, service=service,
         # cannot set these after the fact, so we set them here
         clear_local_storage=True,
         clear_session_storage=True,
-    )
+    ))
 
 @capybara.register_driver('selenium-safari')
 def init_safari(app):
@@ -68,13 +80,13 @@ def init_safari(app):
     - often takes a really long break (5+ seconds) before a test starts
     """
     
-    return Driver(app, browser='safari',
+    return launched(Driver(app, browser='safari',
         # executable_path is actually the path to the safaridriver, not to a custom safari version
         # executable_path=find_application('Safari Technology Preview', executable_name='safaridriver'),
         # cannot set these after the fact, so we set them here
         clear_local_storage=True,
         clear_session_storage=True
-    )
+    ))
 
 @capybara.register_driver('selenium-remote-selenium')
 def init_remote_firefox(app):
@@ -93,11 +105,12 @@ def init_remote_firefox(app):
     options.set_preference("dom.disable_beforeunload", False)
     # options = webdriver.ChromeOptions()
     
-    return Driver(app, browser='remote',
+    return launched(Driver(app, browser='remote',
         clear_local_storage=True,
         clear_session_storage=True,
         options=options,
-    )
+        command_executor=selenium_grid_url() + '/wd/hub',
+    ))
 
 
 capybara.default_driver = "selenium-firefox"
@@ -108,6 +121,11 @@ def configure_driver(browser_vendor, run_selenium_firefox_in_docker_if_neccessar
     with capybara.using_driver(f"selenium-{browser_vendor}"):
         yield
 
+@pytest.fixture(scope='session', autouse=True)
+def configure_browser(is_headless, browser_executable):
+    global headless, executable
+    headless, executable = is_headless, browser_executable
+
 @pytest.fixture(scope='session', autouse=True)
 def configure_base_url(flask_uri):
     capybara.app_host = flask_uri
@@ -119,7 +137,7 @@ def test_google():
     - pretty much the original capybara api. Nice!
     - just running generates warnings :-(
     """
-
+    
     page.visit("https://google.com")
     page.click_button('Ich stimme zu')
     page.fill_in(title='Suche', value='Selenium')
@@ -143,6 +161,14 @@ def test_nested_select_with_retry():
     inner = page.find('#outer').find('#inner', text='fnord')
     assert 'fnord' in inner.text
 
+def test_wait_detection_latency(request):
+    """
+    - synchronize() retries every 50ms, so changes are noticed 25ms late on average, plus a round trip
+    """
+    page.visit(wait_latency.path())
+    wait_latency.measure(request.node, 'synchronize', page.evaluate_script,
+        lambda index: page.find(f'#mutation-{index}'))
+
 @pytest.mark.xfail_safari(reason="fill_in doesn't work")
 def test_fill_form():
     """
@@ -214,7 +240,7 @@ def test_select_by_different_criteria():
     # Complex criteria
     assert_field(id_='input_id', label='input_label', placeholder='input_placeholder')
 
-def test_debugging_support(tmp_path):
+def test_debugging_support(tmp_path, assert_screenshot, artifacts):
     """
     - not very much special debugging support
     - getting at the html for a selection is not intuitive
@@ -231,9 +257,14 @@ def test_debugging_support(tmp_path):
     # get screenshot of page
     path = tmp_path / 'full_screenshot.png'
     page.save_screenshot(path)
+    # identical screenshots are kept only once
+    artifacts.adopt(path)
     assert_is_png(path)
+    # the input may show a caret or focus ring, a few anti aliased pixels may differ
+    field_mask = mask_around(capybara_geometry(page, field)[0].rect, margin=4)
+    assert_screenshot(path, 'full_page', tolerance=.001, masks=[field_mask])
 
-def test_isolation(ask_to_leave_script, browser_vendor):
+def test_isolation(ask_to_leave_script, browser_vendor, performance_budget):
     """
     - easy fast reset between tests, that resets pretty much everything that normal web applications use
     - cookies, localStorage, sessionStorage (though *Storage only if configured)
@@ -251,7 +282,7 @@ def test_isolation(ask_to_leave_script, browser_vendor):
     assert len(cookies) == 1
     assert cookies[0]['name'] == 'test_cookie'
     assert page.driver.browser.get_cookie('test_cookie')['value'] == 'test_value'
-
+    
     # write local storage
     page.evaluate_script("window.localStorage.setItem('test_key', 'test_value_localstorage')")
     assert page.evaluate_script("window.localStorage.getItem('test_key')") == 'test_value_localstorage'
@@ -290,8 +321,15 @@ def test_isolation(ask_to_leave_script, browser_vendor):
     
     # reset() is where the magic happens
     # only resets local- and sessionStorage if configured in Driver()
-    with assert_no_slower_than(1):
-        page.reset()
+    # the first round is the one with dialogs and extra windows, so it is not thrown away as warmup
+    with performance_budget(seconds=1, operation='reset', warmup=0) as budget:
+        for round, sample in enumerate(budget):
+            if round > 0:
+                # something to throw away in the following rounds too
+                page.visit('/')
+                page.fill_in('input_label', value='fnord')
+            with sample:
+                page.reset()
     
     assert len(page.windows) == 1
     assert page.current_url == 'about:blank'
@@ -389,7 +427,7 @@ def test_work_with_multiple_browsers():
     with capybara.using_session('second browser'):
         page.visit('/')
         page.fill_in('input_label', value='second browser')
-
+    
     assert page.find_field('input_label').value == 'first browser'
     
     with capybara.using_session('second browser'):
@@ -435,19 +473,8 @@ def test_basic_auth(flask_uri):
     assert page.text == 'Authenticated'
 
 def is_in_viewport(element):
-    viewport_height = page.evaluate_script('window.innerHeight')
-    viewport_width = page.evaluate_script('window.innerWidth')
-    scroll_from_top = page.evaluate_script('window.scrollY')
-    scroll_from_left = page.evaluate_script('window.scrollY')
-    
-    client_rect = element.evaluate_script('this.getBoundingClientRect()')
-    
-    return not (
-        client_rect['top'] > viewport_height + scroll_from_top
-        or client_rect['left'] > viewport_width + scroll_from_left
-        or  client_rect['bottom'] < scroll_from_top
-        or client_rect['right'] < scroll_from_left
-    )
+    # one round trip, see geometry.py
+    return capybara_geometry(page, element)[0].in_viewport
 
 @pytest.mark.xfail_safari(reason="""Deems text of invisible elements visible,
 and raises different exceptions than ElementClickInterceptedException""")
@@ -480,7 +507,7 @@ def test_invisible_and_hidden_elements():
         # raises if element is invisible, cannot accidentally interact with hidden element
         with pytest.raises(interaction_exception):
             page.find(selector, visible=False).click()
-
+    
     # So convenient that this can be set using a context manager.
     # For a test, an API that would hook into a teardown API could be nicer, as it doesn't indent the code
     # But that requires integration from the API to (all) the test frameworks. So...
@@ -491,6 +518,8 @@ def test_invisible_and_hidden_elements():
         assert_visibility('.behind', is_visible=True, text='Hidden because behind another div',
             interaction_exception=ElementClickInterceptedException
         )
+        # js can tell that it is covered though
+        assert capybara_geometry(page, page.find('.behind'))[0].occluded
         
         # Content scrolled out of view
         # capybara is missing support to check wether an element is scrolled into view
@@ -499,3 +528,54 @@ def test_invisible_and_hidden_elements():
         # will auto scroll into view
         page.find('.below_scroll').click()
         assert is_in_viewport(page.find('.below_scroll'))
+
+def test_shadow_dom():
+    """
+    - capybara doesn't know about shadow doms, neither css nor xpath pierce them
+    - searching all open shadow roots in one script gives capybara elements nonetheless, just without the retry
+    """
+    page.visit('/shadow')
+    with capybara.using_wait_time(0), pytest.raises(capybara.exceptions.ElementNotFound):
+        page.find('input[name="first"]')
+    
+    shadow_query.capybara_find(page, 'First Name', by=shadow_query.LABEL).set('First')
+    assert 'First' == shadow_query.capybara_find(page, 'input[name="first"]').value
+    
+    # closed shadow doms stay closed
+    with pytest.raises(NoSuchElementException):
+        shadow_query.capybara_find(page, 'input[name="last"]')
+
+STRESS_ROWS = 10_000
+STRESS_FIELDS = 1_000
+STRESS_COMPONENTS = 100
+
+@pytest.mark.xfail_safari(reason="fill_in doesn't work")
+def test_large_dom(request):
+    """
+    - same pages as the selenium version, see app.py
+    - find checks that a match is unique, so it always looks at every candidate
+    - fill_in by label is one call, but its xpath gets expensive with thousands of fields
+    """
+    node = request.node
+    last = STRESS_ROWS - 1
+    with timing(node, f'load {STRESS_ROWS} rows'):
+        page.visit(f'/stress/table?rows={STRESS_ROWS}')
+    with timing(node, 'find by id'):
+        row = page.find(f'#row-{last}')
+    with timing(node, 'find by text'):
+        cell = page.find('xpath', f'//td[text()="cell {last}-0"]')
+    with timing(node, 'visibility'):
+        assert row.visible and cell.visible
+    
+    last = STRESS_FIELDS - 1
+    page.visit(f'/stress/form?fields={STRESS_FIELDS}')
+    with timing(node, 'fill by label'):
+        page.fill_in(f'Field {last}', value='fnord')
+    assert 'fnord' == page.find(f'#field-{last}').value
+    
+    last = STRESS_COMPONENTS - 1
+    page.visit(f'/stress/shadow?components={STRESS_COMPONENTS}')
+    with timing(node, 'find through shadow roots'):
+        input = shadow_query.capybara_find(page, f'input[name="field-{last}"]')
+    input.set('fnord')
+    assert 'fnord' == input.value
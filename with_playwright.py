@@ -12,7 +12,13 @@ from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeo
 
 import pytest
 
-from conftest import assert_is_png, assert_is_file, assert_no_slower_than, add_auth_to_uri
+import har
+import recording
+from benchmark import timing
+import wait_latency
+from geometry import playwright_geometry
+from visual_diff import mask_around
+from conftest import CONCURRENT_USERS, assert_is_png, assert_is_webm, assert_is_har, assert_is_zip, add_auth_to_uri, selenium_grid_url
 
 WAIT = 5000
 
@@ -41,7 +47,7 @@ def browser(browser_vendor, is_headless,
         - But it only supports Chromium
         """
         import os
-        os.environ['SELENIUM_REMOTE_URL'] = 'http://localhost:4444/wd/hub'
+        os.environ['SELENIUM_REMOTE_URL'] = selenium_grid_url() + '/wd/hub'
         browser_vendor = 'chrome'
     with sync_playwright() as sync_api:
         browser_name_mapping = dict(chrome='chromium', firefox='firefox', safari='webkit')
@@ -51,11 +57,24 @@ def browser(browser_vendor, is_headless,
         instance.close()
 
 # contexts are what guarantees test isolation - every test gets a new one
+# recorded according to --recording / @pytest.mark.recording, see recording.py
 @pytest.fixture
-def context(browser, flask_uri):
-    context = browser.new_context(base_url=flask_uri)
+def context(browser, flask_uri, request):
+    policy = recording.policy_of(request.node)
+    if not recording.is_recording(policy, request.node):
+        context = browser.new_context(base_url=flask_uri)
+        yield context
+        context.close()
+        return
+    
+    tmp_path = request.getfixturevalue('tmp_path')
+    recorder = recording.Recorder(tmp_path / 'recording-scratch')
+    context = browser.new_context(base_url=flask_uri, **recorder.context_options())
+    recorder.start(context)
     yield context
-    context.close()
+    kept = recorder.finish(context, recording.is_kept(policy, request.node), tmp_path / 'recording')
+    if kept is not None:
+        request.node.user_properties.append(('recording', str(kept)))
 
 # and can potentially open many pages, which are auto closed when the context is
 @pytest.fixture
@@ -90,6 +109,14 @@ def test_nested_select_with_retry(page):
     inner = page.wait_for_selector('css=#outer >> css=#inner:has-text("fnord")')
     assert 'fnord' in inner.text_content()
 
+def test_wait_detection_latency(page, request):
+    """
+    - wait_for_selector() is driven from the page, using raf / mutation polling, so it notices changes right away
+    """
+    page.goto(wait_latency.path())
+    wait_latency.measure(request.node, 'wait_for_selector', page.evaluate,
+        lambda index: page.wait_for_selector(f'#mutation-{index}', state='attached'))
+
 def test_fill_form(page):
     """
     - placeholder not supported for text selector - why?
@@ -164,7 +191,7 @@ def test_select_by_different_criteria(page, xpath):
     # xpath library integration works
     assert_field('xpath=' + xpath.field('input_label'))
 
-def test_debugging_support(page, flask_uri, tmp_path):
+def test_debugging_support(page, flask_uri, tmp_path, assert_screenshot, artifacts):
     """
     - getting the html of a selection is not intuitive
     - screenshots, even of parts of page!
@@ -182,15 +209,23 @@ def test_debugging_support(page, flask_uri, tmp_path):
     assert field.get_property('outerHTML').json_value().startswith('<input id=')
     
     # get screenshot of page
-    path = tmp_path / 'full_screenshot.png'
-    page.screenshot(path=path)
+    # page.screenshot(path=path) writes it, without a path the png stays in memory. Stored once per content
+    png = page.screenshot()
+    path = artifacts.save(png, tmp_path / 'full_screenshot.png')
     assert_is_png(path)
+    # the input may show a caret or focus ring, a few anti aliased pixels may differ
+    field_mask = mask_around(playwright_geometry(page, field)[0].rect, margin=4)
+    assert_screenshot(png, 'full_page', tolerance=.001, masks=[field_mask])
     # get screenshot of part of page
-    path = tmp_path / 'partial_screenshot.png'
-    field.screenshot(path=path)
+    # masking the caret would mask the whole shot, without focus there is none
+    field.evaluate('element => element.blur()')
+    png = field.screenshot()
+    path = artifacts.save(png, tmp_path / 'partial_screenshot.png')
     assert_is_png(path)
+    assert_screenshot(png, 'field', tolerance=.001)
     
     # get video, har and trace of test
+    # (the context fixture can do this for every test, keeping only what failed, see recording.py)
     browser = page.context.browser
     video_dir = tmp_path / 'videos'
     har_path = tmp_path / 'recorded.har'
@@ -202,25 +237,28 @@ def test_debugging_support(page, flask_uri, tmp_path):
     page.fill('text=input_label', 'fnord')
     context.tracing.stop(path=trace_path)
     context.close() # save video and har files
+    artifacts.adopt(trace_path)
     
     # video plays
     video_paths = list(video_dir.iterdir())
     assert len(video_paths) == 1
     video_path = video_paths[0]
-    assert_is_file(video_path, '.webm', b'.webm: WebM')
+    assert_is_webm(video_path)
     
     # har
-    # inside the docker container the `file` utility is so old that it doesn't recognize json data
-    # and instead returns '/recorded.har: ASCII text'.
-    assert_is_file(har_path, '.har', b'/recorded.har: (JSON data|ASCII text)')
+    assert_is_har(har_path)
+    recording = har.read(har_path)
+    assert [200] == [request.status for request in recording.find(path='/selector_playground', method='GET')]
+    har.assert_no_request_slower_than(recording, 500, path='/selector_playground')
+    assert recording.waterfall(recording.find(path='/selector_playground')[0].pageref).bytes > 0
     
     # trace
-    assert_is_file(trace_path, '.zip', b'/trace.zip: Zip archive data')
+    assert_is_zip(trace_path)
     # Trace contains har file, screenshots of every step 
     # and a full trace of playwright commands sent to the browser.
     # Wooot!
 
-def test_isolation(page, flask_uri, ask_to_leave_script, browser_vendor):
+def test_isolation(page, flask_uri, ask_to_leave_script, browser_vendor, performance_budget):
     """
     - test isolation is achieved at the context level
     - each test is supposed to get a new context, but share the browser (so that's what I'm emulating here)
@@ -282,11 +320,18 @@ def test_isolation(page, flask_uri, ask_to_leave_script, browser_vendor):
     
     # This is the big reset
     # quite fast!
-    with assert_no_slower_than(1):
-        browser = page.context.browser
-        page.context.close()
-        context = browser.new_context()
-        page = context.new_page()
+    # the first round is the one with dialogs and extra windows, so it is not thrown away as warmup
+    with performance_budget(seconds=1, operation='reset', warmup=0) as budget:
+        for round, sample in enumerate(budget):
+            if round > 0:
+                # something to throw away in the following rounds too
+                page.goto(flask_uri)
+                page.fill('text=input_label', value='fnord')
+            with sample:
+                browser = page.context.browser
+                page.context.close()
+                context = browser.new_context()
+                page = context.new_page()
     
     # windows gone - no delay!
     assert len(context.pages) == 1
@@ -385,7 +430,7 @@ def test_basic_auth(page, browser, flask_uri, browser_vendor):
     # Thats because playwright auto enables the setting 
     # http://kb.mozillazine.org/Network.http.phishy-userpass-length
     # network.http.phishy-userpass-length 255
-
+    
     assert page.inner_text('body') == 'Authenticated'
     
     # Accoring to the docs this is the recommended way to do basic authentication
@@ -397,20 +442,29 @@ def test_basic_auth(page, browser, flask_uri, browser_vendor):
     page.goto('/basic_auth')
     assert page.inner_text('body') == 'Authenticated'
 
+def test_drive_many_contexts_concurrently(browser, flask_uri, request):
+    """
+    - the same users as in with_playwright_async.py, recorded under the same operation name,
+      so the benchmark report puts the sync and the async api next to each other
+    - one user after the other is all the sync api can do, it must not be used from several threads
+    """
+    def user(number):
+        context = browser.new_context(base_url=flask_uri)
+        page = context.new_page()
+        page.goto('/')
+        page.fill('text=input_label', value=f'user {number}')
+        value = page.input_value('#input_id')
+        context.close()
+        return value
+    
+    expected = [f'user {number}' for number in range(CONCURRENT_USERS)]
+    
+    with timing(request.node, f'{CONCURRENT_USERS} users one after the other'):
+        assert expected == [user(number) for number in range(CONCURRENT_USERS)]
+
 def is_in_viewport(page, element):
-    viewport_height = page.evaluate('window.innerHeight')
-    viewport_width = page.evaluate('window.innerWidth')
-    scroll_from_top = page.evaluate('window.scrollY')
-    scroll_from_left = page.evaluate('window.scrollY')
-    
-    rect = element.bounding_box()
-    
-    return not (
-        rect['y'] > viewport_height + scroll_from_top
-        or rect['x'] > viewport_width + scroll_from_left
-        or rect['y'] + rect['height'] < scroll_from_top
-        or rect['x'] + rect['width'] < scroll_from_left
-    )
+    # one round trip, see geometry.py
+    return playwright_geometry(page, element)[0].in_viewport
 
 @contextmanager
 def using_wait_time(page, wait_time):
@@ -464,6 +518,8 @@ def test_invisible_and_hidden_elements(page):
         assert_visibility('.out_of_frame', is_visible=True, inner_text='Hidden because moved out of frame')
         
         assert_visibility('.behind', is_visible=True, inner_text='Hidden because behind another div')
+        # js can tell that it is covered though
+        assert playwright_geometry(page, find('.behind'))[0].occluded
         
         # Content scrolled out of view
         # capybara is missing support to check wether an element is scrolled into view
@@ -495,4 +551,63 @@ def test_shadow_dom(page, context, force_open_shadow_dom_script):
     page = context.new_page()
     page.goto('/shadow')
     page.fill('text=Last Name', 'Last')
-    assert page.input_value('text=Last Name') == 'Last'
\ No newline at end of file
+    assert page.input_value('text=Last Name') == 'Last'
+
+STRESS_ROWS = 10_000
+STRESS_FIELDS = 1_000
+STRESS_COMPONENTS = 100
+
+def test_large_dom(page, request):
+    """
+    - same pages as the selenium version, see app.py
+    - piercing shadow roots is just css
+    """
+    node = request.node
+    last = STRESS_ROWS - 1
+    with timing(node, f'load {STRESS_ROWS} rows'):
+        page.goto(f'/stress/table?rows={STRESS_ROWS}')
+    with timing(node, 'find by id'):
+        row = page.wait_for_selector(f'#row-{last}')
+    with timing(node, 'find by text'):
+        cell = page.wait_for_selector(f'td:text-is("cell {last}-0")')
+    with timing(node, 'visibility'):
+        assert row.is_visible() and cell.is_visible()
+    
+    last = STRESS_FIELDS - 1
+    page.goto(f'/stress/form?fields={STRESS_FIELDS}')
+    with timing(node, 'fill by label'):
+        page.fill(f'text="Field {last}"', 'fnord')
+    assert 'fnord' == page.input_value(f'#field-{last}')
+    
+    last = STRESS_COMPONENTS - 1
+    page.goto(f'/stress/shadow?components={STRESS_COMPONENTS}')
+    with timing(node, 'find through shadow roots'):
+        page.fill(f'input[name="field-{last}"]', 'fnord')
+    assert 'fnord' == page.input_value(f'input[name="field-{last}"]')
+
+@pytest.fixture
+def recording_expectation(tmp_path):
+    "requested before page, so its teardown checks what the context fixture did with the recording"
+    expected = dict(kept=None)
+    yield expected
+    assert not (tmp_path / 'recording-scratch').exists()
+    assert expected['kept'] == (tmp_path / 'recording' / 'recorded.har').exists()
+
+@pytest.mark.recording('on')
+def test_recording_of_closed_context(recording_expectation, page, context, tmp_path):
+    """
+    - the context fixture records into a scratch dir, see recording.py
+    - tests may close the context themselves (like test_isolation), video and har are kept anyway
+    """
+    page.goto('/selector_playground')
+    page.fill('text=input_label', 'fnord')
+    assert str(page.video.path()).startswith(str(tmp_path / 'recording-scratch'))
+    context.close()
+    recording_expectation['kept'] = True
+
+@pytest.mark.recording('retain-on-failure')
+def test_recording_discarded_on_success(recording_expectation, page, tmp_path):
+    page.goto('/selector_playground')
+    page.fill('text=input_label', 'fnord')
+    assert (tmp_path / 'recording-scratch').exists()
+    recording_expectation['kept'] = False
@@ -0,0 +1,191 @@
+# https://playwright.dev/python/docs/library#usage
+# Same browsers, same protocol as with_playwright.py, but through the asyncio api.
+# - every call is a coroutine, so independent pages and contexts can be driven at the same time
+#   from a single thread with asyncio.gather()
+# - needs pytest-asyncio to run async tests and fixtures
+
+import asyncio
+import time
+
+import pytest
+import pytest_asyncio
+from playwright.async_api import async_playwright
+
+from benchmark import record_timing
+from conftest import CONCURRENT_USERS, add_auth_to_uri, selenium_grid_url
+
+WAIT = 5000
+
+# the browser fixture is session scoped, so it needs an event loop that lives as long
+@pytest.fixture(scope='session')
+def event_loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+@pytest_asyncio.fixture(scope='session')
+async def browser(browser_vendor, is_headless,
+    run_selenium_chrome_in_docker_if_neccessary,
+    run_playwright_chrome_in_docker_if_neccessary
+):
+    async with async_playwright() as async_api:
+        if 'remote-playwright' == browser_vendor:
+            instance = await async_api.chromium.connect(
+                ws_endpoint=run_playwright_chrome_in_docker_if_neccessary.url,
+            )
+            yield instance
+            await instance.close()
+            return
+        
+        if 'remote-selenium' == browser_vendor:
+            import os
+            os.environ['SELENIUM_REMOTE_URL'] = selenium_grid_url() + '/wd/hub'
+            browser_vendor = 'chrome'
+        
+        browser_name_mapping = dict(chrome='chromium', firefox='firefox', safari='webkit')
+        browser = getattr(async_api, browser_name_mapping[browser_vendor])
+        instance = await browser.launch(headless=is_headless)
+        yield instance
+        await instance.close()
+
+@pytest_asyncio.fixture
+async def context(browser, flask_uri):
+    context = await browser.new_context(base_url=flask_uri)
+    yield context
+    await context.close()
+
+@pytest_asyncio.fixture
+async def page(context):
+    page = await context.new_page()
+    page.set_default_timeout(WAIT)
+    yield page
+
+@pytest.mark.asyncio
+async def test_nested_select_with_retry(page):
+    """
+    - exactly the same as the sync api, just with more awaits
+    """
+    await page.goto('/dynamic_disclose')
+    await page.click('text=Trigger')
+    inner = await page.wait_for_selector('css=#outer >> css=#inner:has-text("fnord")')
+    assert 'fnord' in await inner.text_content()
+
+@pytest.mark.asyncio
+async def test_fill_form(page):
+    """
+    - filling fields of the same page concurrently is not a good idea, they all fight for the focus
+    """
+    await page.goto('/form')
+    await page.fill('text=First name', 'Martin')
+    await page.fill('text=Last name', 'Häcker')
+    await page.fill('[placeholder="your@email"]', 'foo@bar.org')
+    
+    # reading on the other hand can happen all at once
+    assert ['Martin', 'Häcker', 'foo@bar.org'] == await asyncio.gather(
+        page.input_value('#first_name'),
+        page.input_value('#last_name'),
+        page.input_value('#email'),
+    )
+
+@pytest.mark.asyncio
+async def test_fallback_to_selenium_and_js(page):
+    await page.goto('/form')
+    element = await page.query_selector('text=First name')
+    
+    assert await element.evaluate('e => e.tagName') == 'LABEL'
+    parent = await element.evaluate_handle('e => e.parentElement')
+    assert await (await parent.get_property('tagName')).json_value() == 'FORM'
+
+@pytest.mark.asyncio
+async def test_isolation(page, flask_uri):
+    """
+    - reset works just like in the sync api: throw away the context
+    """
+    await page.goto('/')
+    await page.context.add_cookies([dict(name='test_cookie', value='test_value', url=flask_uri)])
+    await page.evaluate("window.localStorage.setItem('test_key', 'test_value_localstorage')")
+    
+    browser = page.context.browser
+    await page.context.close()
+    context = await browser.new_context(base_url=flask_uri)
+    page = await context.new_page()
+    
+    await page.goto('/')
+    assert len(await context.cookies()) == 0
+    assert await page.evaluate("window.localStorage.length") == 0
+    await context.close()
+
+async def open_and_fill(context, value):
+    page = await context.new_page()
+    await page.goto('/')
+    await page.fill('text=input_label', value=value)
+    return page
+
+@pytest.mark.asyncio
+async def test_working_with_multiple_window(context):
+    """
+    - windows of one context are independent enough to be driven concurrently
+    """
+    first_page, second_page = await asyncio.gather(
+        open_and_fill(context, 'first window'),
+        open_and_fill(context, 'second window'),
+    )
+    
+    assert await first_page.input_value('#input_id') == 'first window'
+    assert await second_page.input_value('#input_id') == 'second window'
+
+@pytest.mark.asyncio
+async def test_work_with_multiple_browsers(browser, context, flask_uri):
+    """
+    - as do contexts, which is what multiple concurrent logins need
+    """
+    second_context = await browser.new_context(base_url=flask_uri)
+    first_page, second_page = await asyncio.gather(
+        open_and_fill(context, 'first browser'),
+        open_and_fill(second_context, 'second browser'),
+    )
+    
+    assert await first_page.input_value('#input_id') == 'first browser'
+    assert await second_page.input_value('#input_id') == 'second browser'
+    await second_context.close()
+
+@pytest.mark.asyncio
+async def test_basic_auth(browser, flask_uri):
+    context = await browser.new_context(
+        http_credentials={"username": "admin", "password": "password"},
+        base_url=flask_uri,
+    )
+    page = await context.new_page()
+    await page.goto('/basic_auth')
+    assert await page.inner_text('body') == 'Authenticated'
+    
+    # credentials in the url work too
+    await page.goto(add_auth_to_uri(flask_uri, 'admin', 'password') + '/basic_auth')
+    assert await page.inner_text('body') == 'Authenticated'
+    await context.close()
+
+@pytest.mark.asyncio
+async def test_drive_many_contexts_concurrently(browser, flask_uri, request):
+    """
+    - many users from one process, each in its own context
+    - awaiting one user after the other is what the sync api is restricted to,
+      gathering them lets the browser work on all contexts at once
+    - both wall clock times are recorded, see `pytest --benchmark`,
+      with_playwright.py records the sync api doing the same under the same name
+    """
+    async def user(number):
+        context = await browser.new_context(base_url=flask_uri)
+        page = await open_and_fill(context, f'user {number}')
+        value = await page.input_value('#input_id')
+        await context.close()
+        return value
+    
+    expected = [f'user {number}' for number in range(CONCURRENT_USERS)]
+    
+    start = time.perf_counter()
+    assert expected == [await user(number) for number in range(CONCURRENT_USERS)]
+    record_timing(request.node, f'{CONCURRENT_USERS} users one after the other', time.perf_counter() - start)
+    
+    start = time.perf_counter()
+    assert expected == await asyncio.gather(*(user(number) for number in range(CONCURRENT_USERS)))
+    record_timing(request.node, f'{CONCURRENT_USERS} users concurrently', time.perf_counter() - start)
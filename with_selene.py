@@ -1,8 +1,16 @@
 # https://github.com/yashaka/selene
 
 from selene import by, be, have, query
-from conftest import find_firefox, assert_is_png, assert_no_slower_than
-
+from conftest import find_firefox, assert_is_png
+from locator_chain import selene_element
+from locators import by_label
+import shadow_query
+import wait_latency
+from benchmark import timing
+from geometry import selene_geometry
+from visual_diff import mask_around
+
+from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.firefox.options import Options
 
 from selenium.webdriver import Firefox
@@ -51,13 +59,17 @@ def test_nested_select_with_retry(browser, flask_uri):
     browser.open(flask_uri + '/dynamic_disclose')
     browser.element(by.text('Trigger')).click()
     browser.element(by.css('#outer')).element(by.css('#inner')).should(have.text('fnord'))
+    # each retry of the above resolves #outer and #inner with a command each, this is one round trip per retry
+    selene_element(browser, by.css('#outer'), by.css('#inner')).should(have.text('fnord'))
 
-def by_label(label_text):
-    # could use xpath library from capybara
-    return by.xpath(
-        f'//input[@id = //label[contains(string(.), "{label_text}")]/@for]'
-        f' | //label[contains(string(.), "{label_text}")]//input'
-    )
+def test_wait_detection_latency(browser, flask_uri, request):
+    """
+    - should() retries every 100ms or so, each retry a round trip
+    """
+    browser.open(flask_uri + wait_latency.path())
+    evaluate = lambda expression: browser.config.driver.execute_script(f'return {expression}')
+    wait_latency.measure(request.node, 'selene should', evaluate,
+        lambda index: browser.element(f'#mutation-{index}').should(be.present))
 
 def test_fill_form(browser, flask_uri):
     """
@@ -91,7 +103,7 @@ def test_fallback_to_selenium_and_js(browser, flask_uri):
     selenium_browser = browser.config.driver
     from selenium import webdriver
     assert isinstance(selenium_browser, webdriver.Firefox)
-
+    
     element = browser.element(by_label('First name'))
     
     from selenium.webdriver.remote.webelement import WebElement
@@ -133,7 +145,7 @@ def test_select_by_different_criteria(browser, flask_uri, xpath):
     
     assert_field(by.xpath(xpath.field('input_label')))
 
-def test_debugging_support(browser, flask_uri, tmp_path):
+def test_debugging_support(browser, flask_uri, tmp_path, assert_screenshot):
     """
     - basic support, nothing surprising
     - nice that it has outer_html in it's api
@@ -152,6 +164,9 @@ def test_debugging_support(browser, flask_uri, tmp_path):
     path = tmp_path / 'full_screenshot.png'
     browser.save_screenshot(path.as_posix()) # doesn't accept pathlib paths!
     assert_is_png(path)
+    # the input may show a caret or focus ring, a few anti aliased pixels may differ
+    field_mask = mask_around(selene_geometry(browser, field)[0].rect, margin=4)
+    assert_screenshot(path, 'full_page', tolerance=.001, masks=[field_mask])
     # can generate filenames and has browser.last_screenshot() to get that path later
 
 from contextlib import contextmanager
@@ -176,6 +191,54 @@ def window_opened_by(browser, a_function):
     browser.switch_to.window(original_window)
     return new_windows.pop()
 
+def test_shadow_dom(browser, flask_uri):
+    """
+    - selene doesn't know about shadow doms, neither css nor xpath pierce them
+    - a lazy element that searches all open shadow roots in one script retries like any other
+    """
+    browser.open(flask_uri + '/shadow')
+    browser.all('input[name="first"]').should(have.size(0))
+    
+    shadow_query.selene_element(browser, 'First Name', by=shadow_query.LABEL).type('First')
+    shadow_query.selene_element(browser, 'input[name="first"]').should(have.value('First'))
+    
+    # closed shadow doms stay closed
+    with pytest.raises(TimeoutException):
+        shadow_query.selene_element(browser, 'input[name="last"]').with_(timeout=.5).should(be.present)
+
+STRESS_ROWS = 10_000
+STRESS_FIELDS = 1_000
+STRESS_COMPONENTS = 100
+
+def test_large_dom(browser, flask_uri, request):
+    """
+    - same pages as the selenium version, see app.py
+    - elements are lazy, should() is where the search (and its retries) happen
+    """
+    node = request.node
+    last = STRESS_ROWS - 1
+    with timing(node, f'load {STRESS_ROWS} rows'):
+        browser.open(flask_uri + f'/stress/table?rows={STRESS_ROWS}')
+    with timing(node, 'find by id'):
+        row = browser.element(f'#row-{last}').should(be.present)
+    with timing(node, 'find by text'):
+        cell = browser.element(by.xpath(f'//td[text()="cell {last}-0"]')).should(be.present)
+    with timing(node, 'visibility'):
+        row.should(be.visible)
+        cell.should(be.visible)
+    
+    last = STRESS_FIELDS - 1
+    browser.open(flask_uri + f'/stress/form?fields={STRESS_FIELDS}')
+    with timing(node, 'fill by label'):
+        browser.element(by_label(f'Field {last}')).type('fnord')
+    browser.element(f'#field-{last}').should(have.value('fnord'))
+    
+    last = STRESS_COMPONENTS - 1
+    browser.open(flask_uri + f'/stress/shadow?components={STRESS_COMPONENTS}')
+    with timing(node, 'find through shadow roots'):
+        input = shadow_query.selene_element(browser, f'input[name="field-{last}"]').should(be.present)
+    input.type('fnord').should(have.value('fnord'))
+
 def test_isolation(browser, flask_uri, ask_to_leave_script):
     """
     - no support for reset, just starts a new browser with a new profile
@@ -7,6 +7,7 @@ from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support.wait import POLL_FREQUENCY
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import (
     ElementClickInterceptedException, ElementNotInteractableException, NoSuchElementException,
@@ -15,10 +16,17 @@ from selenium.common.exceptions import (
 from selenium.webdriver.common.alert import Alert
 from selenium.webdriver.firefox.service import Service as FirefoxService
 from selenium.webdriver.chrome.service import Service as ChromeService
-from webdriver_manager.chrome import ChromeDriverManager
-from webdriver_manager.firefox import GeckoDriverManager
 
-from conftest import find_application, assert_is_png, add_auth_to_uri
+import dom_wait
+import shadow_query
+import wait_latency
+from benchmark import record_timing, timing
+from conftest import assert_is_png, add_auth_to_uri, selenium_grid_url
+from driver_resolver import resolve_driver
+from geometry import selenium_geometry
+from visual_diff import mask_around
+from locators import by_aria_label, by_attributes, by_label, by_placeholder, by_title, by_value
+from webdriver_pool import WebDriverPool
 
 import pytest
 
@@ -27,7 +35,7 @@ from rich import inspect as i
 
 WAIT = 2
 
-def firefox(is_headless):
+def firefox(is_headless, executable):
     options = webdriver.FirefoxOptions()
     options.headless = is_headless
     # required or marionette will not allow beforeunload dialogs
@@ -36,22 +44,22 @@ def firefox(is_headless):
     # http://kb.mozillazine.org/Network.http.phishy-userpass-length
     # currently set automatically
     # options.set_preference('network.http.phishy-userpass-length', 255)
-    options.binary_location = find_application('Firefox')
+    options.binary_location = executable.path
     
-    service = FirefoxService(GeckoDriverManager().install())
+    service = FirefoxService(resolve_driver('firefox', executable.version))
     
     return webdriver.Firefox(options=options, service=service)
 
-def chrome(is_headless):
+def chrome(is_headless, executable):
     options = webdriver.ChromeOptions()
-    options.binary_location = find_application('Google Chrome')
+    options.binary_location = executable.path
     options.headless = is_headless
     
-    service = ChromeService(ChromeDriverManager().install())
+    service = ChromeService(resolve_driver('chrome', executable.version))
     
     return webdriver.Chrome(options=options, service=service)
-    
-def safari(is_headless):
+
+def safari(is_headless, executable):
     """
     - no headless support
     - strange differences
@@ -61,7 +69,7 @@ def safari(is_headless):
     """
     return webdriver.Safari()
 
-def remote(is_headless):
+def remote(is_headless, executable):
     """
     - Run tests in ff,chrome,edge in docker
     - observe with vnc or browser based vnc
@@ -76,26 +84,54 @@ def remote(is_headless):
     # required or marionette will not allow beforeunload dialogs
     options.set_preference("dom.disable_beforeunload", False)
     # options = webdriver.ChromeOptions()
-    return webdriver.Remote(command_executor='http://localhost:4444', options=options)
+    return webdriver.Remote(command_executor=selenium_grid_url(), options=options)
 
-@pytest.fixture
-def browser(browser_vendor, run_selenium_firefox_in_docker_if_neccessary, is_headless):
+@pytest.fixture(scope='session')
+def driver_pool(browser_vendor, browser_executable, run_selenium_firefox_in_docker_if_neccessary, is_headless, request):
+    """
+    - starting a browser per test is what makes selenium tests slow, so drivers are shared via a pool
+    - the pool resets them between tests, and recycles them after `--driver-max-uses` tests or if they crash
+    """
     browsers = {
         'firefox': firefox,
         'chrome': chrome,
         'safari': safari,
         'remote-selenium': remote,
     }
-    browser = browsers[browser_vendor](is_headless)
-    browser.implicitly_wait(WAIT)
+    
+    def launch():
+        browser = browsers[browser_vendor](is_headless, browser_executable)
+        browser.implicitly_wait(WAIT)
+        return browser
+    
+    pool = WebDriverPool(launch, max_uses=request.config.getoption('driver_max_uses'))
+    try:
+        yield pool
+    finally:
+        pool.close()
+
+@pytest.fixture
+def browser(driver_pool):
+    browser = driver_pool.checkout()
     try:
         yield browser
     finally:
-        browser.quit()
+        driver_pool.checkin(browser)
 
+# checks out a second slot of the pool
 browser2 = browser
 
-def until(driver, condition, wait=WAIT):
+def until(driver, condition, wait=WAIT, node=None):
+    """
+    dom_wait conditions are checked in the page right after every dom change,
+    python callables are polled by WebDriverWait every 500ms
+    """
+    if isinstance(condition, dom_wait.Condition):
+        waited = dom_wait.wait_for(driver, condition, wait)
+        if node is not None:
+            record_timing(node, 'wait', waited.seconds)
+        return waited.value
+    
     driver.implicitly_wait(0)
     try:
         return WebDriverWait(driver, wait).until(condition)
@@ -119,42 +155,51 @@ def test_google(browser):
     search_field.send_keys('Selenium' + Keys.RETURN)
     
     # Need explicit wait, or the next assertion fires before the page has finished loading
-    until(browser, EC.presence_of_element_located((By.CLASS_NAME, 'g')))
+    until(browser, dom_wait.located((By.CLASS_NAME, 'g')))
     
     assert len(browser.find_elements(By.CSS_SELECTOR, '.g')) >= 9
     
     elements = browser.find_elements(By.CSS_SELECTOR, '.g')
     assert any(map(lambda each: 'Selenium automates browsers' in each.text, elements))
 
-class NestedSearch(object):
-    
-    def __init__(self, *locators):
-        self.locators = locators
-    
-    def __call__(self, driver):
-        current = driver
-        for locator in self.locators:
-            current = current.find_element(*locator)
-        return current
-
-def test_nested_select_with_retry(browser, flask_uri):
+def test_nested_select_with_retry(browser, flask_uri, request):
     """
     - nested searching sucks, but is possible with some helpers
+    - dom_wait.located() resolves the whole chain in one script (see locator_chain.py),
+      polling with WebDriverWait would notice the change up to 500ms late, a MutationObserver in the page right away
     """
     browser.get(flask_uri + '/dynamic_disclose')
     browser.find_element(By.XPATH, '//*[text()="Trigger"]').click()
-    inner = until(browser, NestedSearch(
+    inner = until(browser, dom_wait.located(
         (By.ID, 'outer'),
         (By.XPATH, './/*[@id="inner"][contains(text(), "fnord")]')
-    ))
+    ), node=request.node)
     assert 'fnord' in inner.text
 
-def by_label(label_text):
-    # could use xpath library from capybara
-    return (By.XPATH, 
-        f'//input[@id = //label[contains(string(.), "{label_text}")]/@for]'
-        f' | //label[contains(string(.), "{label_text}")]//input'
-    )
+def test_wait_detection_latency(browser, flask_uri, request):
+    """
+    - WebDriverWait polls every 500ms, so it notices changes 250ms late on average
+    - a MutationObserver in the page answers about one round trip after the change
+    """
+    evaluate = lambda expression: browser.execute_script(f'return {expression}')
+    
+    browser.get(flask_uri + wait_latency.path())
+    polled = wait_latency.measure(request.node, 'WebDriverWait', evaluate,
+        lambda index: until(browser, EC.presence_of_element_located((By.ID, f'mutation-{index}'))))
+    
+    browser.get(flask_uri + wait_latency.path())
+    waits = []
+    def wait_pushed(index):
+        waits.append(dom_wait.wait_for(browser, dom_wait.located((By.ID, f'mutation-{index}')), WAIT))
+    pushed = wait_latency.measure(request.node, 'MutationObserver', evaluate, wait_pushed)
+    # next to the total: how much of it the observer takes, before the answer travels back to python
+    in_page = wait_latency.record_in_page(request.node, 'MutationObserver', [waited.detected for waited in waits], evaluate)
+    # both on the page clock, so this holds without any clock sync uncertainty
+    assert all(latency >= 0 for latency in in_page)
+    
+    # both distributions end up in `pytest --benchmark`, comparing them here would flake on a loaded machine.
+    # A whole poll interval is a generous bound for the push based wait, even over a remote grid
+    assert sorted(pushed)[len(pushed) // 2] < POLL_FREQUENCY
 
 def test_fill_form(browser, flask_uri):
     """
@@ -205,10 +250,18 @@ def test_select_by_different_criteria(browser, flask_uri, xpath):
     assert_field(By.CSS_SELECTOR, '[placeholder=input_placeholder][name=input_name]')
     assert_field(By.XPATH, '//*[@placeholder="input_placeholder"][@name="input_name"]')
     
+    # or with a (memoized) locator builder, see locators.py
+    assert_field(*by_label('input_label'))
+    assert_field(*by_placeholder('input_placeholder'))
+    assert_field(*by_aria_label('input_aria_label'))
+    assert_field(*by_title('input_title'))
+    assert_field(*by_value('input_value'))
+    assert_field(*by_attributes(placeholder='input_placeholder', name='input_name'))
+    
     # can integrate xpath libraries
     assert_field(By.XPATH, xpath.field('input_label'))
 
-def test_debugging_support(browser, flask_uri, tmp_path):
+def test_debugging_support(browser, flask_uri, tmp_path, assert_screenshot, artifacts):
     """
     - nothing special, nothign unexpected
     """
@@ -222,9 +275,13 @@ def test_debugging_support(browser, flask_uri, tmp_path):
     
     
     # get screenshot of page
-    path = tmp_path / 'full_screenshot.png'
-    browser.save_screenshot(path.as_posix())
+    # browser.save_screenshot(path) writes it, get_screenshot_as_png() keeps it in memory. Stored once per content
+    png = browser.get_screenshot_as_png()
+    path = artifacts.save(png, tmp_path / 'full_screenshot.png')
     assert_is_png(path)
+    # the input may show a caret or focus ring, a few anti aliased pixels may differ
+    field_mask = mask_around(selenium_geometry(browser, field)[0].rect, margin=4)
+    assert_screenshot(png, 'full_page', tolerance=.001, masks=[field_mask])
     
     # getting at browser logs used to be an enableable capability
     # and then browser.get_log('browser'). But that was lost in the transition to webdriver
@@ -235,6 +292,8 @@ def test_isolation(browser, flask_uri, ask_to_leave_script):
     """
     - no support for reset, just starts a new browser with a new profile
     - Effective, if brute force. Also really slow. :-/
+    - Reset can be hand built (see webdriver_pool.reset()), but cookies and storage can only be cleared
+      for the origin that is currently shown
     """
 
 @pytest.mark.xfail_safari(reason='beforeunload not supported')
@@ -361,19 +420,8 @@ def test_basic_auth(browser, flask_uri):
     # for auth basic support
 
 def is_in_viewport(browser, element):
-    viewport_height = browser.execute_script('return window.innerHeight')
-    viewport_width = browser.execute_script('return window.innerWidth')
-    scroll_from_top = browser.execute_script('return window.scrollY')
-    scroll_from_left = browser.execute_script('return window.scrollY')
-    
-    client_rect = browser.execute_script('return arguments[0].getBoundingClientRect()', element)
-    
-    return not (
-        client_rect['top'] > viewport_height + scroll_from_top
-        or client_rect['left'] > viewport_width + scroll_from_left
-        or  client_rect['bottom'] < scroll_from_top
-        or client_rect['right'] < scroll_from_left
-    )
+    # one round trip, see geometry.py
+    return selenium_geometry(browser, element)[0].in_viewport
 
 @contextmanager
 def using_wait_time(browser, wait_time):
@@ -431,6 +479,8 @@ def test_invisible_and_hidden_elements(flask_uri, browser):
             '.behind', is_visible=True, text='Hidden because behind another div',
             interaction_exception=ElementClickInterceptedException
         )
+        # js can tell that it is covered though
+        assert selenium_geometry(browser, find('.behind'))[0].occluded
         
         # Content scrolled out of view
         # capybara is missing support to check wether an element is scrolled into view
@@ -445,6 +495,7 @@ def test_shadow_dom(flask_uri, browser, force_open_shadow_dom_script):
     """
     - no way to pierce through shadow dom implicitly
     - need to explicitly select every web component on the way to pierce manually through it
+    - or search all open shadow roots in one script, see shadow_query.py
     """
     browser.get(flask_uri + '/shadow')
     
@@ -461,11 +512,20 @@ def test_shadow_dom(flask_uri, browser, force_open_shadow_dom_script):
     # cannot pierce closed shadow dom by default
     with using_wait_time(browser, 1), pytest.raises(NoSuchShadowRootException):
         browser.find_element(By.CSS_SELECTOR, 'labeled-input[name="last"]').shadow_root
+    
+    # one round trip, no matter how deeply the components are nested
+    input = shadow_query.find(browser, 'input[name="first"]')
+    assert 'First' == input.get_property('value')
+    assert input == shadow_query.find(browser, 'First Name', by=shadow_query.LABEL)
+    assert 1 == len(shadow_query.find_all(browser, 'First Name', by=shadow_query.TEXT))
+    # closed stays closed
+    with pytest.raises(NoSuchElementException):
+        shadow_query.find(browser, 'Last Name', by=shadow_query.LABEL)
 
 @pytest.mark.xfail_firefox(reason='execute_cdp_cmd only supported on chromium')
 @pytest.mark.xfail_safari(reason='execute_cdp_cmd only supported on chromium')
 def test_force_open_shadow_dom(flask_uri, browser, force_open_shadow_dom_script):
-    
+
     browser.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {'source': force_open_shadow_dom_script})
     browser.get(flask_uri + '/shadow')
     
@@ -475,4 +535,37 @@ def test_force_open_shadow_dom(flask_uri, browser, force_open_shadow_dom_script)
     input = web_component.find_element(By.CSS_SELECTOR, 'input')
     input.send_keys('First')
     assert 'First' == input.get_property('value')
-    
\ No newline at end of file
+
+STRESS_ROWS = 10_000
+STRESS_FIELDS = 1_000
+STRESS_COMPONENTS = 100
+
+def test_large_dom(browser, flask_uri, request):
+    """
+    - by id is a lookup table in the browser, by text has to walk the whole dom
+    - labels via xpath get expensive with thousands of fields
+    - timings show up in `pytest --benchmark`, scale the pages up via their query arguments, see app.py
+    """
+    node = request.node
+    last = STRESS_ROWS - 1
+    with timing(node, f'load {STRESS_ROWS} rows'):
+        browser.get(flask_uri + f'/stress/table?rows={STRESS_ROWS}')
+    with timing(node, 'find by id'):
+        row = browser.find_element(By.ID, f'row-{last}')
+    with timing(node, 'find by text'):
+        cell = browser.find_element(By.XPATH, f'//td[text()="cell {last}-0"]')
+    with timing(node, 'visibility'):
+        assert row.is_displayed() and cell.is_displayed()
+    
+    last = STRESS_FIELDS - 1
+    browser.get(flask_uri + f'/stress/form?fields={STRESS_FIELDS}')
+    with timing(node, 'fill by label'):
+        browser.find_element(*by_label(f'Field {last}')).send_keys('fnord')
+    assert 'fnord' == browser.find_element(By.ID, f'field-{last}').get_property('value')
+    
+    last = STRESS_COMPONENTS - 1
+    browser.get(flask_uri + f'/stress/shadow?components={STRESS_COMPONENTS}')
+    with timing(node, 'find through shadow roots'):
+        input = shadow_query.find(browser, f'input[name="field-{last}"]')
+    input.send_keys('fnord')
+    assert 'fnord' == input.get_property('value')
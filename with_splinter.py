@@ -2,9 +2,16 @@
 
 from pathlib import Path
 
+from selenium.webdriver.common.by import By
 from selenium.webdriver.firefox.options import Options
 from splinter import Browser
 from conftest import assert_is_png, find_firefox
+from locator_chain import TEXT, splinter_find
+import locators
+import shadow_query
+from benchmark import timing
+from geometry import splinter_geometry
+from visual_diff import mask_around
 
 import pytest
 
@@ -16,7 +23,7 @@ def browser():
     options = Options()
     options.binary = find_firefox()
     options.headless = HEADLESS
-
+    
     with Browser('firefox', options=options) as browser:
         yield browser
         browser.quit()
@@ -49,13 +56,14 @@ def test_nested_select_with_retry(browser, flask_uri):
     browser.is_text_present('fnord')
     inner = browser.find_by_css('#outer').find_by_css('#inner')
     assert 'fnord' in inner.text
+    
+    # mixing in matchers works with a locator chain, which also resolves in one round trip
+    inner = splinter_find(browser, (By.CSS_SELECTOR, '#outer'), (TEXT, 'fnord'))
+    assert 'fnord' in inner.text
 
 def by_label(label_text):
-    # could use xpath library from capybara
-    return (
-        f'//input[@id = //label[contains(string(.), "{label_text}")]/@for]'
-        f' | //label[contains(string(.), "{label_text}")]//input'
-    )
+    # splinter wants the bare xpath
+    return locators.by_label(label_text).selector
 
 def test_fill_form(browser, flask_uri):
     """
@@ -85,7 +93,7 @@ def test_fallback_to_selenium_and_js(browser, flask_uri):
     
     from selenium import webdriver
     assert isinstance(browser.driver, webdriver.Firefox)
-
+    
     element = browser.find_by_xpath(by_label('First name')).first
     
     selenium_element = element._element
@@ -125,7 +133,7 @@ def test_select_by_different_criteria(browser, flask_uri, xpath):
     # xpath selector libraries easy to use
     assert_field(browser.find_by_xpath(xpath.field('input_label')))
 
-def test_debugging_support(browser, flask_uri, tmp_path):
+def test_debugging_support(browser, flask_uri, tmp_path, assert_screenshot):
     """
     - nothing special, nothign unexpected
     - also doesn't seem to make a distinction between html attributes and js properties
@@ -145,6 +153,56 @@ def test_debugging_support(browser, flask_uri, tmp_path):
     # Other APIs either allow you to set an explicit path, or create the whole path randomly
     actual_path = browser.screenshot(path.as_posix())
     assert_is_png(Path(actual_path))
+    # the input may show a caret or focus ring, a few anti aliased pixels may differ
+    field_mask = mask_around(splinter_geometry(browser, field)[0].rect, margin=4)
+    assert_screenshot(actual_path, 'full_page', tolerance=.001, masks=[field_mask])
+
+def test_shadow_dom(browser, flask_uri):
+    """
+    - splinter doesn't pierce shadow doms either
+    - searching all open shadow roots in one script gives splinter elements nonetheless, just without waiting
+    """
+    browser.visit(flask_uri + '/shadow')
+    assert browser.find_by_css('input[name="first"]').is_empty()
+    
+    shadow_query.splinter_find(browser, 'First Name', by=shadow_query.LABEL).fill('First')
+    assert 'First' == shadow_query.splinter_find(browser, 'input[name="first"]').value
+    
+    # closed shadow doms stay closed
+    assert shadow_query.splinter_find(browser, 'input[name="last"]').is_empty()
+
+STRESS_ROWS = 10_000
+STRESS_FIELDS = 1_000
+STRESS_COMPONENTS = 100
+
+def test_large_dom(browser, flask_uri, request):
+    """
+    - same pages as the selenium version, see app.py
+    - find_by_* return lists, so the first match is what counts
+    """
+    node = request.node
+    last = STRESS_ROWS - 1
+    with timing(node, f'load {STRESS_ROWS} rows'):
+        browser.visit(flask_uri + f'/stress/table?rows={STRESS_ROWS}')
+    with timing(node, 'find by id'):
+        row = browser.find_by_id(f'row-{last}').first
+    with timing(node, 'find by text'):
+        cell = browser.find_by_xpath(f'//td[text()="cell {last}-0"]').first
+    with timing(node, 'visibility'):
+        assert row.visible and cell.visible
+    
+    last = STRESS_FIELDS - 1
+    browser.visit(flask_uri + f'/stress/form?fields={STRESS_FIELDS}')
+    with timing(node, 'fill by label'):
+        browser.find_by_xpath(by_label(f'Field {last}')).fill('fnord')
+    assert 'fnord' == browser.find_by_id(f'field-{last}').value
+    
+    last = STRESS_COMPONENTS - 1
+    browser.visit(flask_uri + f'/stress/shadow?components={STRESS_COMPONENTS}')
+    with timing(node, 'find through shadow roots'):
+        input = shadow_query.splinter_find(browser, f'input[name="field-{last}"]').first
+    input.fill('fnord')
+    assert 'fnord' == input.value
 
 def test_isolation(browser, flask_uri, ask_to_leave_script):
     """
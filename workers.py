@@ -0,0 +1,51 @@
+# Per worker resources when running with pytest-xdist (`pytest -n auto`)
+#
+# Every worker is its own process with its own flask server (already on an ephemeral port), its own browsers
+# and its own docker compose project. The ports docker publishes are shifted by the worker index,
+# so the containers of different workers don't clash. With a shift of one port per worker the ranges of the
+# services stay apart up to the smallest distance between two base ports (over a thousand workers).
+
+import os
+
+PORT_STRIDE = 1
+
+# base ports as used in docker-compose.yml, with the environment variables that override them there
+PORTS = {
+    'selenium-grid': ('SELENIUM_GRID_PORT', 4444),
+    'selenium-vnc': ('SELENIUM_VNC_PORT', 5900),
+    'selenium-web-vnc': ('SELENIUM_WEB_VNC_PORT', 7900),
+    'playwright-server': ('PLAYWRIGHT_SERVER_PORT', 2342),
+}
+
+def worker_id():
+    "'gw0', 'gw1', … when running under xdist, 'main' otherwise"
+    return os.environ.get('PYTEST_XDIST_WORKER', 'main')
+
+def worker_index():
+    if 'main' == worker_id():
+        return 0
+    return int(worker_id().removeprefix('gw'))
+
+def max_workers():
+    "workers before the port range of one service runs into the next one"
+    base_ports = sorted(base_port for environment_variable, base_port in PORTS.values())
+    return min(higher - lower for lower, higher in zip(base_ports, base_ports[1:])) // PORT_STRIDE
+
+def port(name):
+    if worker_index() >= max_workers():
+        raise RuntimeError(f'{worker_id()}: docker ports of more than {max_workers()} workers would overlap')
+    base_port = PORTS[name][1]
+    return base_port + PORT_STRIDE * worker_index()
+
+def docker_compose(*arguments):
+    "command line to run `docker compose` in the compose project of this worker"
+    command = ['docker', 'compose']
+    if 'main' != worker_id():
+        command += ['--project-name', f'browser-automation-comparison-{worker_id()}']
+    return command + list(arguments)
+
+def docker_compose_environment():
+    environment = dict(os.environ)
+    for name, (environment_variable, base_port) in PORTS.items():
+        environment[environment_variable] = str(port(name))
+    return environment